@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Per-channel and per-region band-power cube (recording × channel × band).
+#
+# Written by scripts/build_eeg_summary.py next to eeg_summary.csv as one Parquet
+# file. Each row is one recording at either channel level or region level
+# (regions from montage.REGION_MAP, averaged in dB like the summary's
+# *_mean columns), with one float32 column per band. Pages load it once and
+# answer "power of channel/region X in recording Y" with an index lookup
+# instead of recomputing spectra.
+
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from band_power import BANDS
+from montage import CHANNEL_REGION, REGION_MAP
+
+CUBE_PATH = "data/clean/eeg_band_cube.parquet"
+KEYS = ["participant_id", "session", "task"]
+LEVELS = ("channel", "region")
+BAND_COLS = list(BANDS.keys())
+
+
+def build_cube(keys: Sequence[Dict], channel_names: Sequence[List[str]],
+               channel_power: Sequence[np.ndarray]) -> pd.DataFrame:
+    """Long cube from per-recording (n_channels, n_bands) dB power arrays."""
+    frames = []
+    for key, chs, power in zip(keys, channel_names, channel_power):
+        ch_df = pd.DataFrame(np.asarray(power, dtype=np.float32), columns=BAND_COLS)
+        ch_df.insert(0, "name", list(chs))
+        ch_df.insert(1, "region", [CHANNEL_REGION.get(ch, "") for ch in chs])
+        ch_df.insert(0, "level", "channel")
+
+        present = ch_df[ch_df["region"] != ""]
+        reg_df = present.groupby("region", sort=False)[BAND_COLS].mean()
+        reg_df = reg_df.reindex([r for r in REGION_MAP if r in reg_df.index]).reset_index()
+        reg_df.insert(0, "name", reg_df["region"])
+        reg_df.insert(0, "level", "region")
+
+        both = pd.concat([ch_df, reg_df], ignore_index=True)
+        for k in KEYS:
+            both.insert(KEYS.index(k), k, key[k])
+        frames.append(both)
+    return concat_cubes(frames)
+
+
+def concat_cubes(frames: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """Stack cube pieces (e.g. reused + recomputed recordings) with the cube dtypes."""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=KEYS + ["level", "name", "region"] + BAND_COLS)
+    cube = pd.concat([f.astype({c: str for c in KEYS + ["level", "name", "region"]}) for f in frames],
+                     ignore_index=True)
+    for c in KEYS + ["level", "name", "region"]:
+        cube[c] = cube[c].astype("category")
+    cube[BAND_COLS] = cube[BAND_COLS].astype(np.float32)
+    return cube
+
+
+def write_cube(cube: pd.DataFrame, path: str = CUBE_PATH):
+    tmp = path + ".tmp"
+    cube.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+class BandCube:
+    """Indexed view over the cube: lookups by recording, level and name."""
+
+    def __init__(self, cube: pd.DataFrame):
+        self.frame = cube.set_index(KEYS + ["level", "name"]).sort_index()
+        self.bands = [c for c in BAND_COLS if c in cube.columns]
+
+    @classmethod
+    def load(cls, path: str = CUBE_PATH):
+        """None when the cube has not been built yet."""
+        if not os.path.exists(path):
+            return None
+        return cls(pd.read_parquet(path))
+
+    def recording(self, participant_id: str, session: str, task: str,
+                  level: str = "channel") -> pd.DataFrame:
+        """Band power of every channel (or region) in one recording, indexed by name."""
+        try:
+            out = self.frame.loc[(participant_id, session, task, level)]
+        except KeyError:
+            return pd.DataFrame(columns=["region"] + self.bands)
+        return out[["region"] + self.bands]
+
+    def table(self, level: str = "region") -> pd.DataFrame:
+        """All recordings at one level, flat (keys + name + bands) for joins/plots."""
+        out = self.frame.xs(level, level="level").reset_index()
+        return out[KEYS + ["name", "region"] + self.bands]
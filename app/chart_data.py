@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Server-side aggregation for Altair charts.
+#
+# Altair embeds its data in the Vega spec sent to the browser, and transforms
+# such as bin or regression run there on every rerun. These helpers compute
+# the aggregate instead, so a chart receives one row per bin (or two rows for
+# a fitted line) no matter how many respondents are plotted.
+
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def nice_bins(lo: float, hi: float, maxbins: int = 20, base: int = 10) -> np.ndarray:
+    """Bin edges with a "nice" step (1, 2 or 5 × 10^k), as Vega's bin transform picks them."""
+    if not np.isfinite(lo) or not np.isfinite(hi):
+        return np.array([0.0, 1.0])
+    span = hi - lo
+    if span <= 0:
+        return np.array([lo, lo + 1.0])
+    level = np.ceil(np.log(maxbins) / np.log(base))
+    step = base ** (np.round(np.log(span) / np.log(base)) - level)
+    while np.ceil(span / step) > maxbins:
+        step *= base
+    for div in (5, 2):
+        if span / (step / div) <= maxbins:
+            step /= div
+    start = np.floor(lo / step) * step
+    stop = np.ceil(hi / step) * step
+    return np.linspace(start, stop, int(round((stop - start) / step)) + 1)
+
+
+def _bin_index(edges: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """Bin of each value; bins are right-open except the last, which holds the maximum."""
+    return np.clip(np.searchsorted(edges, x, side="right") - 1, 0, len(edges) - 2)
+
+
+def _numeric(values) -> np.ndarray:
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+
+
+def _finite(values) -> np.ndarray:
+    x = _numeric(values)
+    return x[np.isfinite(x)]
+
+
+def _finite_pairs(x_values, y_values) -> Tuple[np.ndarray, np.ndarray]:
+    x, y = _numeric(x_values), _numeric(y_values)
+    ok = np.isfinite(x) & np.isfinite(y)
+    return x[ok], y[ok]
+
+
+def histogram(values, maxbins: int = 20) -> pd.DataFrame:
+    """Counts per bin: bin_start, bin_end, count (empty bins included)."""
+    x = _finite(values)
+    if x.size == 0:
+        return pd.DataFrame({"bin_start": [], "bin_end": [], "count": []})
+    edges = nice_bins(x.min(), x.max(), maxbins)
+    counts = np.bincount(_bin_index(edges, x), minlength=len(edges) - 1)
+    return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": counts})
+
+
+def histogram_2d(x_values, y_values, x_maxbins: int = 40, y_maxbins: int = 25) -> pd.DataFrame:
+    """Counts per non-empty (x bin, y bin) cell: x_start, x_end, y_start, y_end, count."""
+    x, y = _finite_pairs(x_values, y_values)
+    if x.size == 0:
+        return pd.DataFrame({"x_start": [], "x_end": [], "y_start": [], "y_end": [], "count": []})
+    x_edges = nice_bins(x.min(), x.max(), x_maxbins)
+    y_edges = nice_bins(y.min(), y.max(), y_maxbins)
+    xi, yi = _bin_index(x_edges, x), _bin_index(y_edges, y)
+    n_y = len(y_edges) - 1
+    cells, counts = np.unique(xi * n_y + yi, return_counts=True)
+    xi, yi = np.divmod(cells, n_y)
+    return pd.DataFrame({"x_start": x_edges[xi], "x_end": x_edges[xi + 1],
+                         "y_start": y_edges[yi], "y_end": y_edges[yi + 1], "count": counts})
+
+
+def regression_line(x_values, y_values) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """Least-squares line (closed form) as its two end points, plus slope/intercept/r2/n."""
+    x, y = _finite_pairs(x_values, y_values)
+    fit = {"slope": np.nan, "intercept": np.nan, "r2": np.nan, "n": int(x.size)}
+    if x.size < 2:
+        return pd.DataFrame({"x": [], "y": []}), fit
+    xc, yc = x - x.mean(), y - y.mean()
+    sxx, sxy, syy = (xc * xc).sum(), (xc * yc).sum(), (yc * yc).sum()
+    if sxx == 0:
+        return pd.DataFrame({"x": [], "y": []}), fit
+    slope = sxy / sxx
+    intercept = y.mean() - slope * x.mean()
+    fit.update(slope=slope, intercept=intercept, r2=sxy * sxy / (sxx * syy) if syy > 0 else np.nan)
+    ends = np.array([x.min(), x.max()])
+    return pd.DataFrame({"x": ends, "y": intercept + slope * ends}), fit
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Precomputed metric × grouping summaries for Compare View.
+#
+# scripts/build_compare_cube.py runs group_stats.summarize() for every numeric
+# metric of each dataset, ungrouped and against every grouping the page offers,
+# and stores all results as one long Parquet table. The page loads it once and
+# answers each dropdown change with a dictionary lookup. The file records a
+# digest of the data files it was built from; if either has changed since, the
+# cube is ignored and the page falls back to computing summaries live.
+
+import os
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from group_stats import group_candidates, group_labels, numeric_columns, summarize
+
+CUBE_PATH = "data/clean/compare_summary_cube.parquet"
+
+# dataset -> (max distinct values, label columns only) for group-by candidates
+GROUPING = {
+    "eeg": (30, True),
+    "nhis": (200, False),
+}
+
+KEY_COLS = ["dataset", "metric", "group_by", "kind"]
+STAT_COLS = ["n", "mean", "std", "median", "q25", "q75", "value"]
+NO_GROUP = ""  # group_by value for ungrouped summaries
+
+SummaryKey = Tuple[str, str, Optional[str]]
+
+
+def file_digest(path: str) -> str:
+    """Content hash, so a checkout on another machine (new mtimes) still matches."""
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def combine_digests(digests: List[str]) -> str:
+    """One digest for data read from several files (a single file keeps its own)."""
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.md5("".join(digests).encode()).hexdigest()
+
+
+# =============================================================================
+# Build
+# =============================================================================
+def _rows(dataset: str, metric: str, group_by: Optional[str], summary: dict) -> pd.DataFrame:
+    key = {"dataset": dataset, "metric": metric, "group_by": group_by or NO_GROUP}
+    if group_by:
+        t = summary["table"]
+        return pd.DataFrame({**key, "kind": "group", "label": t[group_by].astype(str),
+                             **{c: t[c] for c in ["n", "mean", "std", "median", "q25", "q75"]}})
+    d, b = summary["describe"], summary["bins"]
+    return pd.concat([
+        pd.DataFrame({**key, "kind": "describe", "label": d.index.astype(str), "value": d.to_numpy()}),
+        pd.DataFrame({**key, "kind": "bin", "label": b["bin"], "n": b["count"]}),
+        pd.DataFrame({**key, "kind": "qbin", "label": summary["series_index"],
+                      "mean": summary["series"].to_numpy()}),
+    ], ignore_index=True)
+
+
+def build_cube(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Every (dataset, metric, group-by) summary for the given datasets, as one long table."""
+    parts = []
+    for dataset, df in frames.items():
+        max_unique, labels_only = GROUPING[dataset]
+        groups = group_candidates(df, max_unique, labels_only)
+        labels = group_labels(df, groups)
+        for metric in numeric_columns(df):
+            parts.append(_rows(dataset, metric, None, summarize(df[metric])))
+            for g in groups:
+                if g != metric:
+                    parts.append(_rows(dataset, metric, g, summarize(df[metric], labels[g])))
+    cube = pd.concat(parts, ignore_index=True).reindex(columns=KEY_COLS + ["label"] + STAT_COLS)
+    for c in KEY_COLS:
+        cube[c] = cube[c].astype("category")
+    cube[STAT_COLS] = cube[STAT_COLS].astype(np.float64)
+    return cube
+
+
+def write_cube(cube: pd.DataFrame, sources: Dict[str, str], path: str = CUBE_PATH):
+    """`sources`: dataset -> file_digest of the data the cube was built from."""
+    cube = cube.copy(deep=False)
+    cube.attrs["sources"] = dict(sources)
+    tmp = path + ".tmp"
+    cube.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+# =============================================================================
+# Lookup
+# =============================================================================
+class CompareCube:
+    """Summaries keyed by (dataset, metric, group_by) in the shape summarize() returns."""
+
+    def __init__(self, cube: pd.DataFrame):
+        self.sources = dict(cube.attrs.get("sources", {}))
+        self._summaries: Dict[SummaryKey, dict] = {}
+        for (dataset, metric, group_by), rows in cube.groupby(["dataset", "metric", "group_by"],
+                                                              observed=True, sort=False):
+            key = (str(dataset), str(metric), str(group_by) or None)
+            self._summaries[key] = self._unpack(rows, key[2])
+
+    @staticmethod
+    def _unpack(rows: pd.DataFrame, group_by: Optional[str]) -> dict:
+        by_kind = {k: r for k, r in rows.groupby("kind", observed=True)}
+        if group_by:
+            g = by_kind["group"]
+            table = pd.DataFrame({group_by: g["label"].to_numpy(),
+                                  **{c: g[c].to_numpy() for c in ["mean", "std", "median"]},
+                                  "n": g["n"].to_numpy().astype(np.int64),
+                                  "q25": g["q25"].to_numpy(), "q75": g["q75"].to_numpy()})
+            by_mean = table.sort_values("mean", kind="stable")
+            return {"table": table,
+                    "series": by_mean["mean"].reset_index(drop=True),
+                    "series_index": by_mean[group_by].astype(str).reset_index(drop=True)}
+        d = by_kind.get("describe", rows.iloc[0:0])
+        b = by_kind.get("bin", rows.iloc[0:0])
+        q = by_kind.get("qbin", rows.iloc[0:0])
+        return {"describe": pd.Series(d["value"].to_numpy(), index=d["label"].to_numpy()),
+                "bins": pd.DataFrame({"bin": b["label"].to_numpy(), "count": b["n"].to_numpy().astype(np.int64)}),
+                "series": pd.Series(q["mean"].to_numpy()),
+                "series_index": pd.Series(q["label"].to_numpy(), dtype=str)}
+
+    @classmethod
+    def load(cls, path: str = CUBE_PATH, sources: Dict[str, str] = None) -> Optional["CompareCube"]:
+        """None if missing, unreadable, or built from different data than `sources`."""
+        if not os.path.exists(path):
+            return None
+        try:
+            cube = cls(pd.read_parquet(path))
+        except Exception:
+            return None
+        if sources is not None and any(cube.sources.get(k) != v for k, v in sources.items()):
+            return None
+        return cube
+
+    def get(self, dataset: str, metric: str, group_by: Optional[str]) -> Optional[dict]:
+        return self._summaries.get((dataset, metric, group_by or None))
+
+    def keys(self) -> Iterable[SummaryKey]:
+        return self._summaries.keys()
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# Shared data access for all pages.
+#
+# Each dataset is resolved and loaded once per server process into a
+# st.cache_resource entry keyed on (path, mtime), so every page and session
+# shares one in-memory copy and a rebuilt file is picked up on the next rerun.
+# Pages get shallow views of the shared frames: no data is copied, and with
+# pandas copy-on-write anything a page changes on its view (new columns,
+# in-place edits) stays private to that view. Copy-on-write is the default
+# from pandas 3 on and is switched on below for older versions; without it an
+# in-place edit on a view would leak into the shared frame.
+
+import os
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from band_cube import CUBE_PATH, BandCube
+import nhis_store
+from compare_cube import CUBE_PATH as COMPARE_CUBE_PATH, CompareCube, combine_digests, file_digest
+from eeg_summary import load_eeg_summary, participants_table
+from filter_index import FilterIndex
+from survey import DESIGN_COLS
+
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
+EEG_SUMMARY_CANDIDATES = [
+    "data/clean/eeg_summary.csv",
+    "data/eeg_summary.csv",
+    "/mnt/data/eeg_summary.csv",
+]
+PARTICIPANTS_CANDIDATES = [
+    "data/raw/eeg/participants.tsv",
+    "data/participants.tsv",
+    "/mnt/data/participants.tsv",
+]
+DATA_DICTIONARY_JSON = "/mnt/data/participants.json"  # optional: field tooltips
+NHIS_PATH = "data/clean/nhis_sleep_demo_clean.csv"  # single-year fallback if no dataset was built
+NHIS_PATH_YEAR = 2024  # year of a CSV extracted before it carried a `year` column
+NHIS_DATASET = nhis_store.DATASET_PATH
+COORDS_PATH = "data/clean/eeg_channel_coordinates.csv"
+
+
+def first_existing_path(paths: Sequence[str]) -> str:
+    for p in paths:
+        if p and os.path.exists(p):
+            return p
+    return ""
+
+
+def file_mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def _view(df: Optional[pd.DataFrame]) -> pd.DataFrame:
+    return pd.DataFrame() if df is None else df.copy(deep=False)
+
+
+# =============================================================================
+# Process-wide loaders (one entry per file version)
+# =============================================================================
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _eeg_summary(path: str, mtime: float) -> Tuple[pd.DataFrame, FilterIndex]:
+    try:
+        df = load_eeg_summary(path)
+    except Exception:
+        df = None
+    df = pd.DataFrame() if df is None else df
+    return df, FilterIndex(df, categorical=["condition", "task", "Gender"],
+                           ranges=["Age"], group="participant_id")
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _participants(summary_path: str, summary_mtime: float, tsv_path: str, tsv_mtime: float) -> pd.DataFrame:
+    df, _ = _eeg_summary(summary_path, summary_mtime)
+    if not df.empty:
+        return participants_table(df)
+    if not tsv_path:
+        return pd.DataFrame()
+    try:
+        dfp = pd.read_csv(tsv_path, sep="\t")
+    except Exception:
+        try:
+            dfp = pd.read_csv(tsv_path)
+        except Exception:
+            return pd.DataFrame()
+    if "participant_id" in dfp.columns:
+        dfp["participant_id"] = dfp["participant_id"].astype(str)
+    return dfp
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _csv(path: str, mtime: float) -> Optional[pd.DataFrame]:
+    return pd.read_csv(path)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _nhis(version: Tuple, years: Tuple[int, ...], columns: Optional[Tuple[str, ...]],
+          design: bool) -> pd.DataFrame:
+    if nhis_store.available_years(NHIS_DATASET):
+        if columns is None and not design:
+            columns = tuple(c for c in nhis_store.dataset(NHIS_DATASET).schema.names
+                            if c not in DESIGN_COLS and c != nhis_store.YEAR_COL)
+        return nhis_store.read(years, columns, with_year=design, path=NHIS_DATASET)
+    df = _csv(NHIS_PATH, file_mtime(NHIS_PATH))
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    elif not design:
+        df = df.drop(columns=[c for c in DESIGN_COLS + [nhis_store.YEAR_COL] if c in df.columns])
+    return df.assign(**{nhis_store.YEAR_COL: nhis_csv_year()}) if design else df
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _band_cube(path: str, mtime: float) -> Optional[BandCube]:
+    return BandCube.load(path)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _digest(path: str, mtime: float) -> str:
+    return file_digest(path) if path and os.path.exists(path) else ""
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _compare_cube(path: str, mtime: float, sources: Tuple[Tuple[str, str], ...]) -> Optional[CompareCube]:
+    return CompareCube.load(path, dict(sources))
+
+
+@st.cache_resource(show_spinner=False)
+def _json(path: str, mtime: float) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+# =============================================================================
+# Public accessors (cheap: a stat + a cache lookup + a shallow view)
+# =============================================================================
+def eeg_summary_path() -> str:
+    return first_existing_path(EEG_SUMMARY_CANDIDATES)
+
+
+def eeg_summary() -> pd.DataFrame:
+    """Typed EEG summary (see eeg_summary.py); empty frame if none was found."""
+    p = eeg_summary_path()
+    return _view(_eeg_summary(p, file_mtime(p))[0])
+
+
+def eeg_summary_indexed() -> Tuple[pd.DataFrame, FilterIndex]:
+    """EEG summary view plus its shared FilterIndex (positions match the view)."""
+    p = eeg_summary_path()
+    df, index = _eeg_summary(p, file_mtime(p))
+    return _view(df), index
+
+
+def eeg_participants() -> pd.DataFrame:
+    """One row per participant: from the summary, else participants.tsv."""
+    sp = eeg_summary_path()
+    tp = first_existing_path(PARTICIPANTS_CANDIDATES)
+    return _view(_participants(sp, file_mtime(sp), tp, file_mtime(tp)))
+
+
+def nhis_csv_year() -> Optional[int]:
+    """Survey year of the single-year CSV, from its `year` column; None if there is no CSV."""
+    if not os.path.exists(NHIS_PATH):
+        return None
+    year = _csv(NHIS_PATH, file_mtime(NHIS_PATH)).get(nhis_store.YEAR_COL)
+    if year is None or not year.notna().any():
+        return NHIS_PATH_YEAR
+    return int(year.dropna().iloc[0])
+
+
+def nhis_years() -> List[int]:
+    """Survey years available: dataset partitions, else the single-year CSV."""
+    years = nhis_store.available_years(NHIS_DATASET)
+    if years:
+        return years
+    year = nhis_csv_year()
+    return [] if year is None else [year]
+
+
+def _nhis_years(years: Optional[Sequence[int]]) -> Tuple[int, ...]:
+    available = nhis_years()
+    if years is None:
+        return tuple(available[-1:])
+    return tuple(y for y in available if y in years)
+
+
+def nhis_sources(years: Optional[Sequence[int]] = None) -> List[str]:
+    """Files the NHIS data for `years` (default: latest year) is read from."""
+    if nhis_store.available_years(NHIS_DATASET):
+        return nhis_store.partition_files(_nhis_years(years), NHIS_DATASET)
+    return [NHIS_PATH] if os.path.exists(NHIS_PATH) else []
+
+
+def nhis_version(years: Optional[Sequence[int]] = None) -> Tuple:
+    """Cache key for the NHIS data of `years`: the years plus their files' mtimes."""
+    return _nhis_years(years), tuple(file_mtime(p) for p in nhis_sources(years))
+
+
+def nhis_summary(years: Optional[Sequence[int]] = None, columns: Optional[Sequence[str]] = None,
+                 design: bool = False) -> Optional[pd.DataFrame]:
+    """Cleaned NHIS extract, or None if it has not been built.
+
+    Only the given survey years (default: the latest) and columns (default:
+    all survey responses) are read; with the partitioned dataset this happens
+    in the Parquet scan itself.
+    `design` adds the survey design columns and `year` (see survey.py).
+    """
+    if not nhis_sources(years):
+        return None
+    version = nhis_version(years)
+    return _view(_nhis(version, version[0], None if columns is None else tuple(columns), design))
+
+
+def channel_coordinates(path: str = COORDS_PATH) -> Optional[pd.DataFrame]:
+    if not os.path.exists(path):
+        return None
+    return _view(_csv(path, file_mtime(path)))
+
+
+def band_cube() -> Optional[BandCube]:
+    """Per-channel/per-region band power (band_cube.py); None until it is built."""
+    if not os.path.exists(CUBE_PATH):
+        return None
+    return _band_cube(CUBE_PATH, file_mtime(CUBE_PATH))
+
+
+def compare_cube(years: Optional[Sequence[int]] = None) -> Optional[CompareCube]:
+    """Precomputed Compare View summaries (compare_cube.py); None if missing or out of date.
+
+    `years` is the NHIS selection being compared (default: the latest year).
+    """
+    if not os.path.exists(COMPARE_CUBE_PATH):
+        return None
+    eeg_path = eeg_summary_path()
+    nhis_digest = combine_digests([_digest(p, file_mtime(p)) for p in nhis_sources(years)])
+    sources = (("eeg", _digest(eeg_path, file_mtime(eeg_path))), ("nhis", nhis_digest))
+    return _compare_cube(COMPARE_CUBE_PATH, file_mtime(COMPARE_CUBE_PATH), sources)
+
+
+def data_dictionary() -> Dict[str, dict]:
+    return _json(DATA_DICTIONARY_JSON, file_mtime(DATA_DICTIONARY_JSON))
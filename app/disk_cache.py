@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Bounded on-disk LRU cache for downloaded EEG recordings.
+#
+# Files live flat in one directory. Downloads land in a private ".incoming"
+# folder and are renamed into place only once complete, so readers never see a
+# half-written file. Recency is the file mtime (touched on every hit), which
+# keeps the LRU order across restarts without a separate state file. Only real
+# loads go through get(); prefetch probes use contains(), so they neither count
+# as hits nor make a merely-prefetched file look recently used.
+#
+# Eviction is per recording: the samples, header and pyramid of one recording
+# (same name up to the first dot) are removed together, and an on_evict
+# callback lets readers drop their memory maps so the space is really freed.
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+INCOMING_DIR = ".incoming"
+# Recently used files are never evicted, so a reader that just got a path from
+# the cache can still open it even if another session pushes the cache over budget.
+MIN_AGE_SEC = 60.0
+
+
+def _is_cached_name(name: str) -> bool:
+    # Only recordings are managed; indexes/manifests next to them are left alone
+    return name.startswith("sub-") and not name.endswith(".tmp")
+
+
+def recording_key(name: str) -> str:
+    """Files of one recording share their name up to the first dot (.npy, .json, .lod.npy, .csv)."""
+    return name.split(".", 1)[0]
+
+
+EvictCallback = Callable[[str, os.stat_result], None]
+
+
+class RecordingCache:
+    """Byte-budgeted LRU over the recording files in `root`."""
+
+    def __init__(self, root: str, max_bytes: int, min_age_sec: float = MIN_AGE_SEC,
+                 on_evict: Optional[EvictCallback] = None):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.min_age_sec = min_age_sec
+        self.on_evict = on_evict  # called with (path, stat before removal) per evicted file
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # oldest first
+        os.makedirs(os.path.join(root, INCOMING_DIR), exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if _is_cached_name(name) and os.path.isfile(path):
+                st = os.stat(path)
+                entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._sizes[name] = size
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def contains(self, name: str) -> bool:
+        """Whether `name` is cached; a peek that neither counts a hit nor changes LRU order."""
+        with self._lock:
+            return name in self._sizes and os.path.exists(self.path(name))
+
+    def get(self, name: str):
+        """Local path if cached (marks it most recently used), else None."""
+        path = self.path(name)
+        with self._lock:
+            if name not in self._sizes or not os.path.exists(path):
+                self._sizes.pop(name, None)
+                return None
+            self._sizes.move_to_end(name)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, name: str, fetch: Callable[[str], str]) -> str:
+        """Run fetch(staging_dir) -> downloaded path, then rename it into the cache."""
+        with self._lock:
+            self.misses += 1
+        staging = os.path.join(self.root, INCOMING_DIR, uuid.uuid4().hex)
+        os.makedirs(staging)
+        try:
+            downloaded = fetch(staging)
+            final = self.path(name)
+            os.replace(downloaded, final)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        with self._lock:
+            self._sizes[name] = os.path.getsize(final)
+            self._sizes.move_to_end(name)
+            evicted = self._evict()
+        if self.on_evict is not None:
+            for path, st in evicted:
+                self.on_evict(path, st)
+        return final
+
+    def _evict(self) -> List[Tuple[str, os.stat_result]]:
+        """Drop least recently used recordings until under budget; returns the removed files."""
+        evicted = []
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return evicted
+        members: Dict[str, List[str]] = {}
+        newest: Dict[str, int] = {}
+        for i, name in enumerate(self._sizes):  # oldest first
+            key = recording_key(name)
+            members.setdefault(key, []).append(name)
+            newest[key] = i  # a recording is as recent as its newest file
+        now = time.time()
+        for key in sorted(members, key=newest.get):
+            if total <= self.max_bytes:
+                break
+            names = members[key]
+            stats = {}
+            for name in names:
+                try:
+                    stats[name] = os.stat(self.path(name))
+                except OSError:
+                    pass
+            if any(now - st.st_mtime < self.min_age_sec for st in stats.values()):
+                continue
+            for name in names:
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                total -= self._sizes.pop(name)
+                if name in stats:
+                    evicted.append((self.path(name), stats[name]))
+            self.evictions += 1
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "files": len(self._sizes),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Server-side decimation for long signal traces.
+#
+# Plotly serializes every sample to the browser, so traces are reduced to roughly
+# the number of points the plot can show before they are sent:
+#   - min-max: keeps the min and max of each bucket (peaks survive, fully vectorized)
+#   - LTTB:    Largest-Triangle-Three-Buckets, one point per bucket chosen for shape
+
+from typing import Tuple
+
+import numpy as np
+
+METHODS = ("minmax", "lttb")
+
+
+def minmax_indices(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Sorted indices of the min and max sample in each of n_buckets equal buckets."""
+    n = len(y)
+    if n_buckets <= 0 or n <= 2 * n_buckets:
+        return np.arange(n)
+    size = int(np.ceil(n / n_buckets))
+    n_buckets = int(np.ceil(n / size))
+    # Pad the last bucket with its final value so every bucket has `size` samples
+    padded = np.empty(n_buckets * size, dtype=y.dtype)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    blocks = padded.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    idx = np.concatenate([offsets + blocks.argmin(axis=1),
+                          offsets + blocks.argmax(axis=1),
+                          [0, n - 1]])
+    return np.unique(np.minimum(idx, n - 1))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the n_out points chosen by Largest-Triangle-Three-Buckets."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Interior points split into n_out - 2 buckets; first and last are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point for the final bucket)
+        if i < n_out - 3:
+            nlo, nhi = edges[i + 1], edges[i + 2]
+            cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def downsample(x: np.ndarray, y: np.ndarray, n_out: int,
+               method: str = "minmax") -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce (x, y) to about n_out points. Short inputs are returned unchanged."""
+    if len(y) <= n_out:
+        return x, y
+    if method == "minmax":
+        idx = minmax_indices(y, n_out // 2)
+    elif method == "lttb":
+        idx = lttb_indices(x, y, n_out)
+    else:
+        raise ValueError(f"unknown method {method!r}; expected one of {METHODS}")
+    return x[idx], y[idx]
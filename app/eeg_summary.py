@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Typed loader for data/clean/eeg_summary.csv, shared by the EEG pages.
+#
+# The CSV is read once with an explicit schema: labels become categoricals
+# (filters compare integer codes), scores float32, counts int16 and the
+# clock/duration strings timedeltas. The typed frame is cached as Parquet next
+# to the CSV and reused until the CSV changes, so later loads skip parsing.
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+SUMMARY_CSV = "data/clean/eeg_summary.csv"
+SCHEMA_VERSION = 1
+
+CATEGORICAL = [
+    "participant_id", "session", "task", "condition", "Gender", "SessionOrder",
+]
+INT16 = ["n_channels", "Age"]  # float32 instead if a value is missing
+# "H:MM:SS" clock times and "H:MM" times/durations -> timedelta since midnight
+TIMES: Dict[str, str] = {
+    "EEG_SamplingTime_Open_NS": "hms",
+    "EEG_SamplingTime_Closed_NS": "hms",
+    "EEG_SamplingTime_Open_SD": "hms",
+    "EEG_SamplingTime_Closed_SD": "hms",
+    "PVT_SamplingTime_NS": "hms",
+    "PVT_SamplingTime_SD": "hms",
+    "SleepDiary_item1_NS": "hm",
+    "SleepDiary_item2_NS": "hm",
+}
+# Every other numeric column (band power, questionnaires) is float32
+
+
+def cache_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def _fingerprint(csv_path: str) -> str:
+    st = os.stat(csv_path)
+    return f"v{SCHEMA_VERSION}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _parse_times(s: pd.Series) -> pd.Series:
+    s = s.astype("string").str.strip()
+    s = s.where(s.str.count(":") != 1, s + ":00")  # H:MM -> H:MM:00
+    return pd.to_timedelta(s, errors="coerce")
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast a raw summary frame to the typed schema (unknown columns are left as read)."""
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if col in CATEGORICAL:
+            out[col] = s.astype("category")
+        elif col in TIMES:
+            out[col] = _parse_times(s)
+        elif col in INT16 and pd.api.types.is_numeric_dtype(s):
+            out[col] = s.astype(np.int16) if s.notna().all() else s.astype(np.float32)
+        elif pd.api.types.is_numeric_dtype(s):
+            out[col] = s.astype(np.float32)
+        else:
+            out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def load_eeg_summary(csv_path: str = SUMMARY_CSV) -> Optional[pd.DataFrame]:
+    """Typed summary frame, from the Parquet cache when it matches the CSV; None if no CSV."""
+    if not csv_path or not os.path.exists(csv_path):
+        return None
+    fingerprint = _fingerprint(csv_path)
+    parquet = cache_path(csv_path)
+    try:
+        cached = pd.read_parquet(parquet)
+        if cached.attrs.get("source") == fingerprint:
+            cached.attrs.clear()
+            return cached
+    except Exception:
+        pass
+    df = apply_schema(pd.read_csv(csv_path))
+    try:
+        tmp = parquet + ".tmp"
+        df.attrs["source"] = fingerprint
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, parquet)
+    except OSError:
+        pass  # read-only deployment: typed frame still returned, just not cached
+    df.attrs.clear()
+    return df
+
+
+def participants_table(df: pd.DataFrame) -> pd.DataFrame:
+    """One row per participant with the participants.tsv columns of the summary."""
+    per_recording = {"session", "task", "condition", "n_channels", "duration_sec", "sampling_rate",
+                     "theta_mean", "alpha_mean", "beta_mean"}
+    cols = [c for c in df.columns if c not in per_recording]
+    return df[cols].drop_duplicates(subset="participant_id").reset_index(drop=True)
+
+
+def _format_time(td: pd.Series, fmt: str) -> pd.Series:
+    secs = td.dt.total_seconds()
+    h, m, s = secs // 3600, secs % 3600 // 60, secs % 60
+    text = h.map("{:.0f}".format) + ":" + m.map("{:02.0f}".format)
+    if fmt == "hms":
+        text = text + ":" + s.map("{:02.0f}".format)
+    return text.where(td.notna())
+
+
+def format_times(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy with the time columns back in their H:MM[:SS] text form (for display and export)."""
+    out = df.copy()
+    for col, fmt in TIMES.items():
+        if col in out.columns and pd.api.types.is_timedelta64_dtype(out[col]):
+            out[col] = _format_time(out[col], fmt)
+    return out
+
+
+def to_csv(df: pd.DataFrame) -> str:
+    """CSV export in the original eeg_summary.csv formats (times back to H:MM[:SS])."""
+    return format_times(df).to_csv(index=False)
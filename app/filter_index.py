@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Precomputed row index for sidebar filters over a summary table.
+#
+# Built once per loaded frame: categorical columns become per-value bitsets
+# (packed bits, one per row), numeric range columns are kept sorted with their
+# row positions, and the grouping column (participant_id) is stored as codes.
+# A filter is then a handful of bitwise ANDs plus two binary searches, and the
+# result is a sorted array of row positions the page can take from the frame.
+
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+Bitmap = np.ndarray  # packed uint8, see np.packbits
+
+
+class FilterIndex:
+    """Bitset / sorted-column index over a read-only DataFrame."""
+
+    def __init__(self, df: pd.DataFrame, categorical: Sequence[str] = (),
+                 ranges: Sequence[str] = (), group: Optional[str] = None):
+        self.n_rows = len(df)
+        self._all = self._pack(np.ones(self.n_rows, dtype=bool))
+        self.bitsets: Dict[str, Dict[object, Bitmap]] = {}
+        for col in categorical:
+            if col not in df.columns:
+                continue
+            cat = pd.Categorical(df[col])
+            codes = cat.codes
+            self.bitsets[col] = {v: self._pack(codes == i) for i, v in enumerate(cat.categories)}
+        self.sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for col in ranges:
+            if col not in df.columns:
+                continue
+            values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+            pos = np.flatnonzero(~np.isnan(values))  # NaN never matches a range
+            order = pos[np.argsort(values[pos], kind="stable")]
+            self.sorted[col] = (values[order], order)
+        self.group_codes = None
+        if group is not None and group in df.columns:
+            # Categories are sorted, so code order == sort_values(group) order
+            self.group_codes = pd.Categorical(df[group]).codes
+
+    def _pack(self, mask: np.ndarray) -> Bitmap:
+        return np.packbits(mask)
+
+    def isin(self, col: str, values: Iterable) -> Bitmap:
+        """Rows whose `col` is any of `values` (an unindexed column matches everything)."""
+        if col not in self.bitsets:
+            return self._all
+        out = np.zeros_like(self._all)
+        for v in values:
+            bits = self.bitsets[col].get(v)
+            if bits is not None:
+                out |= bits
+        return out
+
+    def between(self, col: str, lo: float, hi: float) -> Bitmap:
+        """Rows with lo <= col <= hi (inclusive, like Series.between)."""
+        if col not in self.sorted:
+            return self._all
+        values, order = self.sorted[col]
+        start = np.searchsorted(values, lo, side="left")
+        stop = np.searchsorted(values, hi, side="right")
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[order[start:stop]] = True
+        return self._pack(mask)
+
+    def select(self, isin: Dict[str, Iterable] = None,
+               between: Dict[str, Tuple[float, float]] = None) -> np.ndarray:
+        """Sorted row positions matching every filter."""
+        bits = self._all.copy()
+        for col, values in (isin or {}).items():
+            bits &= self.isin(col, values)
+        for col, (lo, hi) in (between or {}).items():
+            bits &= self.between(col, lo, hi)
+        return np.flatnonzero(np.unpackbits(bits, count=self.n_rows))
+
+    def first_per_group(self, positions: np.ndarray) -> np.ndarray:
+        """First row of each group among `positions`, ordered by group value."""
+        if self.group_codes is None:
+            return positions
+        codes = self.group_codes[positions].astype(np.int64)
+        codes[codes < 0] = np.iinfo(np.int64).max  # missing ids sort last, like sort_values
+        _, first = np.unique(codes, return_index=True)
+        return positions[first]
+
+    def take(self, df: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+        """Rows of `df` at `positions`; the frame itself when nothing is filtered out."""
+        if len(positions) == self.n_rows:
+            return df
+        return df.iloc[positions]
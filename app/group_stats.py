@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Group statistics for one (metric, grouping) pair, computed in one pass.
+#
+# Compare View needs the same numbers in several places: the group summary
+# table, the bar chart, the "global summary" when nothing is grouped, and the
+# group-level series used for the distribution correlation. summarize() derives
+# all of them from one groupby (or one set of bins) over the metric, so the page
+# can cache one result per (dataset, metric, group-by) and reuse it for every
+# plot style.
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+N_BINS = 8        # equal-width bins for the ungrouped bar chart
+N_QUANTILES = 8   # quantile bins for the ungrouped correlation series
+
+
+# =============================================================================
+# Metric and grouping candidates
+# =============================================================================
+def numeric_columns(df: pd.DataFrame) -> List[str]:
+    return df.select_dtypes(include=[np.number]).columns.tolist()
+
+
+def is_label(s: pd.Series) -> bool:
+    return (pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)
+            or isinstance(s.dtype, pd.CategoricalDtype))
+
+
+def group_candidates(df: pd.DataFrame, max_unique: int, labels_only: bool) -> List[str]:
+    """Low-cardinality columns offered as group-bys (label columns only if `labels_only`)."""
+    return [c for c in df.columns
+            if df[c].nunique() < max_unique and (is_label(df[c]) or not labels_only)]
+
+
+def group_labels(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    """Each group column as a categorical of str ("1.0" for numeric codes, "nan" if missing)."""
+    return pd.DataFrame({c: df[c].astype(str).astype("category") for c in cols}, index=df.index)
+
+
+# =============================================================================
+# Summaries
+# =============================================================================
+def summarize(values: pd.Series, groups: Optional[pd.Series] = None,
+              n_bins: int = N_BINS, n_quantiles: int = N_QUANTILES) -> Dict[str, object]:
+    """Everything Compare View shows for one metric, grouped by `groups` (or not).
+
+    Grouped: {"table": per-group mean/std/median/n/q25/q75 (group column named
+    like `groups`), "series"/"series_index": group means ascending and their labels}.
+    Ungrouped: {"describe": values.describe(), "bins": counts per equal-width
+    bin, "series"/"series_index": means per quantile bin}.
+    """
+    x = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    if groups is not None:
+        frame = pd.DataFrame({"value": x, groups.name: groups.to_numpy()})
+        grouped = frame.groupby(groups.name, observed=True)["value"]
+        table = grouped.agg(["mean", "std", "median", "count"]).rename(columns={"count": "n"})
+        quartiles = grouped.quantile([0.25, 0.75]).unstack()
+        table["q25"], table["q75"] = quartiles[0.25], quartiles[0.75]
+        table = table.reset_index()
+        by_mean = table.sort_values("mean", kind="stable")
+        return {
+            "table": table,
+            "series": by_mean["mean"].reset_index(drop=True),
+            "series_index": by_mean[groups.name].astype(str).reset_index(drop=True),
+        }
+
+    ser = pd.Series(x[~np.isnan(x)])
+    out: Dict[str, object] = {"describe": pd.Series(x, name=values.name).describe()}
+    if ser.empty:
+        out.update(bins=pd.DataFrame({"bin": [], "count": []}),
+                   series=pd.Series(dtype=float), series_index=pd.Series(dtype=str))
+        return out
+    binned = pd.cut(ser, bins=n_bins)
+    counts = binned.value_counts(sort=False)
+    out["bins"] = pd.DataFrame({"bin": counts.index.astype(str), "count": counts.to_numpy()})
+    q = pd.qcut(ser, q=min(n_quantiles, ser.nunique()), duplicates="drop")
+    qmeans = ser.groupby(q, observed=True).mean()
+    out["series"] = pd.Series(qmeans.to_numpy())
+    out["series_index"] = pd.Series(qmeans.index.astype(str))
+    return out
+
+
+def series_cells(values: pd.Series, groups: Optional[pd.Series], series_index: pd.Series,
+                 n_quantiles: int = N_QUANTILES) -> List[np.ndarray]:
+    """Non-missing rows behind each point of summarize()'s "series", in the same order.
+
+    Grouped: the rows of each group label in `series_index`. Ungrouped: the rows
+    of each quantile bin (same bins as summarize()). Used for row-level resampling.
+    """
+    x = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    ok = ~np.isnan(x)
+    if groups is not None:
+        codes = groups.astype(str).to_numpy()[ok]
+        x = x[ok]
+        order = np.argsort(codes, kind="stable")
+        keys, starts = np.unique(codes[order], return_index=True)
+        chunks = dict(zip(keys, np.split(x[order], starts[1:])))
+        return [chunks.get(label, np.empty(0)) for label in series_index]
+    ser = pd.Series(x[ok])
+    if ser.empty:
+        return []
+    q = pd.qcut(ser, q=min(n_quantiles, ser.nunique()), duplicates="drop")
+    codes = q.cat.codes.to_numpy()
+    order = np.argsort(codes, kind="stable")
+    cells = np.split(ser.to_numpy()[order], np.searchsorted(codes[order], np.arange(1, len(q.cat.categories))))
+    return [c for c in cells if c.size]  # summarize() keeps observed bins only
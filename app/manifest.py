@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Fingerprint manifests for the incremental build scripts.
+#
+# scripts/export_eeg_csv.py and scripts/build_eeg_summary.py keep a JSON
+# manifest of the source files they processed (size + mtime) and the
+# parameters they used, and skip work whose entry still matches.
+
+import os
+import json
+from typing import Iterable
+
+EEGLAB_SIDECAR = ".fdt"
+
+
+def file_fingerprint(paths: Iterable[str]) -> dict:
+    """Total size and latest mtime of the existing files in `paths`."""
+    size, mtime = 0, 0.0
+    for p in paths:
+        if os.path.exists(p):
+            st = os.stat(p)
+            size += st.st_size
+            mtime = max(mtime, st.st_mtime)
+    return {"source_size": size, "source_mtime": mtime}
+
+
+def source_fingerprint(set_path: str) -> dict:
+    """Size + mtime of the .set and its .fdt sidecar (EEGLAB keeps samples there)."""
+    return file_fingerprint([set_path, os.path.splitext(set_path)[0] + EEGLAB_SIDECAR])
+
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: dict, path: str):
+    """Write-then-rename so an interrupted run never leaves a truncated manifest."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def is_up_to_date(entry: dict, fingerprint: dict, params: dict, outputs: Iterable[str] = ()) -> bool:
+    """Entry matches the source fingerprint and params, and every output still exists."""
+    return (
+        bool(entry)
+        and entry.get("source_size") == fingerprint["source_size"]
+        and entry.get("source_mtime") == fingerprint["source_mtime"]
+        and entry.get("params") == params
+        and all(os.path.exists(p) for p in outputs)
+    )
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+# 10–20 montage groupings shared by the EEG Viewer and the feature pipeline.
+
+from typing import Dict, List
+
+REGION_MAP: Dict[str, List[str]] = {
+    "Frontal":   ["Fp1","Fp2","Fpz","AFz","AF3","AF4","AF7","AF8","F1","F2","F3","F4","F7","F8","Fz"],
+    "Central":   ["FC1","FC2","FCz","C1","C2","C3","C4","Cz"],
+    "Parietal":  ["CP1","CP2","CPz","P1","P2","P3","P4","P7","P8","Pz","POz"],
+    "Occipital": ["PO3","PO4","PO7","PO8","O1","Oz","O2"],
+    "Temporal":  ["T7","T8","T9","T10","FT7","FT8","TP7","TP8","TP9","TP10"],
+}
+
+CHANNEL_REGION: Dict[str, str] = {ch: region for region, chs in REGION_MAP.items() for ch in chs}
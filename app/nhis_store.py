@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Year-partitioned Parquet store for the NHIS sleep extract.
+#
+# scripts/extract_clean_sleep_demo.py writes one partition per survey year
+# (data/clean/nhis_sleep_demo/year=YYYY/part-0.parquet). Years may differ in
+# which SLP* questions were asked; readers see one harmonized schema (the union
+# of all partitions, missing columns as nulls). Pages read through
+# pyarrow.dataset, so only the requested years (partition pruning) and columns
+# (projection) are loaded.
+
+import os
+import re
+from typing import List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+DATASET_PATH = "data/clean/nhis_sleep_demo"
+YEAR_COL = "year"
+PART_FILE = "part-0.parquet"
+
+_YEAR_DIR = re.compile(r"^year=(\d{4})$")
+_RAW_NAME = re.compile(r"adult(\d{2})\.csv$", re.IGNORECASE)
+
+
+def year_from_filename(path: str) -> Optional[int]:
+    """2024 for ".../adult24.csv" (NHIS public-use file naming); None otherwise."""
+    m = _RAW_NAME.search(os.path.basename(path))
+    return 2000 + int(m.group(1)) if m else None
+
+
+def partition_file(year: int, path: str = DATASET_PATH) -> str:
+    return os.path.join(path, f"{YEAR_COL}={year}", PART_FILE)
+
+
+def available_years(path: str = DATASET_PATH) -> List[int]:
+    if not os.path.isdir(path):
+        return []
+    years = []
+    for entry in os.scandir(path):
+        m = _YEAR_DIR.match(entry.name)
+        if m and os.path.exists(os.path.join(entry.path, PART_FILE)):
+            years.append(int(m.group(1)))
+    return sorted(years)
+
+
+def partition_files(years: Optional[Sequence[int]] = None, path: str = DATASET_PATH) -> List[str]:
+    """Partition files for `years` (all years if None), oldest first."""
+    return [partition_file(y, path) for y in available_years(path) if years is None or y in years]
+
+
+def dataset(path: str = DATASET_PATH) -> ds.Dataset:
+    """All partitions under one unified schema, with `year` as a partition field."""
+    files = partition_files(path=path)
+    # Newest first, so columns keep the latest survey's order
+    schema = pa.unify_schemas([ds.dataset(f, format="parquet").schema for f in reversed(files)])
+    schema = schema.append(pa.field(YEAR_COL, pa.int16()))
+    return ds.dataset(files, schema=schema, format="parquet",
+                      partitioning=ds.partitioning(pa.schema([(YEAR_COL, pa.int16())]), flavor="hive"),
+                      partition_base_dir=path)
+
+
+def read(years: Optional[Sequence[int]] = None, columns: Optional[Sequence[str]] = None,
+         with_year: bool = False, path: str = DATASET_PATH) -> pd.DataFrame:
+    """Rows of the selected years/columns, as pandas.
+
+    Columns absent from a year's partition come back as nulls. The `year`
+    column is included only if `with_year` (or listed in `columns`).
+    """
+    d = dataset(path)
+    if columns is None:
+        columns = [c for c in d.schema.names if c != YEAR_COL]
+    columns = [c for c in columns if c in d.schema.names]
+    if with_year and YEAR_COL not in columns:
+        columns = columns + [YEAR_COL]
+    expr = None if years is None else ds.field(YEAR_COL).isin([int(y) for y in years])
+    return d.to_table(columns=columns, filter=expr).to_pandas()
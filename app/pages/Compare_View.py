@@ -1,10 +1,10 @@
 """
 compare_app.py
 
-Streamlit app: Lab <-> Survey Comparison tab for EEG (OpenNeuro) vs NHIS (2024)
+Streamlit app: Lab <-> Survey Comparison tab for EEG (OpenNeuro) vs NHIS (2024, or any ingested year)
 Assumes:
   eeg-brfss-app/data/clean/eeg_summary.csv
-  eeg-brfss-app/data/clean/nhis_sleep_demo_clean.csv
+  eeg-brfss-app/data/clean/nhis_sleep_demo/ (year-partitioned; else nhis_sleep_demo_clean.csv)
 
 Features:
  - Inspect available columns and auto-detect likely EEG & survey vars
@@ -17,31 +17,37 @@ Features:
 """
 
 from pathlib import Path
+from typing import Hashable, List, Tuple
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 from scipy import stats
 
+import data
+from eeg_summary import format_times, to_csv as summary_to_csv
+from compare_cube import GROUPING
+from group_stats import group_candidates, group_labels, numeric_columns, series_cells, summarize
+from resample import N_RESAMPLES, correlation_uncertainty
+
 # -----------------------
 # Configuration / Paths
 # -----------------------
-EEG_PATH = Path("data/clean/eeg_summary.csv")
-NHIS_PATH = Path("data/clean/nhis_sleep_demo_clean.csv")
+EEG_PATH = Path(data.EEG_SUMMARY_CANDIDATES[0])
+NHIS_PATH = Path(data.NHIS_PATH)
 
 # -----------------------
 # Utilities
 # -----------------------
-@st.cache_data
-def load_csv(path: Path):
-    if not path.exists():
-        return None
+def load_shared(loader, path: Path):
+    """Shared read-only view from app/data.py; None (with an error) if it cannot be read."""
     try:
-        df = pd.read_csv(path)
-        return df
+        df = loader()
     except Exception as e:
         st.error(f"Error loading {path}: {e}")
         return None
+    return None if df is None or df.empty else df
 
 def suggest_columns(df, keywords):
     """Return columns containing any of the keywords (case-insensitive)."""
@@ -55,10 +61,53 @@ def suggest_columns(df, keywords):
                 hits.append(c)
     return hits
 
-def numeric_columns(df):
-    if df is None:
-        return []
-    return df.select_dtypes(include=[np.number]).columns.tolist()
+@st.cache_resource(show_spinner=False, max_entries=4)
+def group_columns(name: str, version: Hashable, _df: pd.DataFrame) -> Tuple[List[str], pd.DataFrame]:
+    """Group-by candidates and their string-labelled versions, derived once per dataset version.
+
+    Returns (columns, labels): `labels` holds each candidate as a categorical of
+    str values (numeric codes become "1.0", missing becomes "nan"), so pages can
+    group and plot without converting, or writing to, the shared frame.
+    """
+    cols = group_candidates(_df, *GROUPING[name])
+    return cols, group_labels(_df, cols)
+
+# Bounded: Streamlit evicts the least recently used entries past max_entries
+@st.cache_data(show_spinner=False, max_entries=128)
+def live_group_summary(dataset: str, version: Hashable, metric: str, group_by,
+                       _df: pd.DataFrame, _labels: pd.DataFrame) -> dict:
+    return summarize(_df[metric], _labels[group_by] if group_by else None)
+
+def group_summary(dataset: str, version: Hashable, metric: str, group_by,
+                  df: pd.DataFrame, labels: pd.DataFrame) -> dict:
+    """All statistics for one (dataset, metric, group-by), shared by every plot style.
+
+    A lookup in the precomputed cube (scripts/build_compare_cube.py) when it
+    matches the data; computed and memoized here otherwise.
+    """
+    hit = compare_cube.get(dataset, metric, group_by) if compare_cube is not None else None
+    if hit is not None:
+        return hit
+    return live_group_summary(dataset, version, metric, group_by, df, labels)
+
+def with_group(df: pd.DataFrame, labels: pd.DataFrame, metric: str, group_by) -> pd.DataFrame:
+    """Metric (+ string group column) as a new frame over the shared columns; nothing is copied."""
+    out = df[[metric]]
+    return out.assign(**{group_by: labels[group_by]}) if group_by else out
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def correlation_ci(selection: tuple, method: str, n: int, _stats_x: dict, _stats_y: dict,
+                   _values_x: pd.Series, _groups_x, _values_y: pd.Series, _groups_y) -> dict:
+    """Row-resampling bootstrap CI for the group-level r, once per selection.
+
+    `selection` identifies the data versions, metrics and group-bys behind the
+    two group summaries; the first `n` points of each series are correlated.
+    """
+    cells_x = series_cells(_values_x, _groups_x, _stats_x["series_index"])
+    cells_y = series_cells(_values_y, _groups_y, _stats_y["series_index"])
+    return correlation_uncertainty(_stats_x["series"].iloc[:n].to_numpy(dtype=float),
+                                   _stats_y["series"].iloc[:n].to_numpy(dtype=float),
+                                   method, cells_x, cells_y)
 
 def safe_corr(series_a, series_b, method="spearman"):
     # remove na
@@ -80,13 +129,24 @@ def safe_corr(series_a, series_b, method="spearman"):
 st.set_page_config(page_title="EEG ↔ NHIS Compare", layout="wide")
 st.title("Lab ↔ Survey Comparison — EEG & NHIS (exploratory, non-diagnostic)")
 
-eeg_df = load_csv(EEG_PATH)
-nhis_df = load_csv(NHIS_PATH)
+eeg_df = load_shared(data.eeg_summary, EEG_PATH)
+# Version of the summary file actually loaded (first existing candidate)
+eeg_version = data.file_mtime(data.eeg_summary_path())
+available_years = data.nhis_years()
+if len(available_years) > 1:
+    nhis_years = st.sidebar.multiselect("NHIS survey year(s)", available_years, default=available_years[-1:])
+else:
+    nhis_years = available_years
+nhis_version = data.nhis_version(nhis_years)
+
+nhis_df = load_shared(lambda: data.nhis_summary(nhis_years), NHIS_PATH)
+compare_cube = data.compare_cube(nhis_years)
 
 if eeg_df is None:
     st.error(f"EEG CSV not found at `{EEG_PATH}`. Update path at top of file if needed.")
 if nhis_df is None:
-    st.error(f"NHIS CSV not found at `{NHIS_PATH}`. Update path at top of file if needed.")
+    st.error(f"NHIS data not found at `{data.NHIS_DATASET}` or `{NHIS_PATH}` (or no survey year selected). "
+             "Run scripts/extract_clean_sleep_demo.py.")
 
 if eeg_df is None or nhis_df is None:
     st.stop()
@@ -96,7 +156,7 @@ if eeg_df is None or nhis_df is None:
 # -----------------------
 with st.expander("Preview datasets & column suggestions (open if you want to verify)"):
     st.subheader("EEG summary (top 5 rows)")
-    st.dataframe(eeg_df.head())
+    st.dataframe(format_times(eeg_df.head()))
 
     st.subheader("NHIS sleep demo (top 5 rows)")
     st.dataframe(nhis_df.head())
@@ -189,8 +249,9 @@ lab_metric = eeg_options[lab_metric_label]
 survey_metric_label = st.sidebar.selectbox("Choose NHIS (Survey) metric", list(nhis_options.keys()))
 survey_metric = nhis_options[survey_metric_label]
 
-# EEG grouping (condition likely exists)
-eeg_group_cols = [c for c in eeg_df.columns if eeg_df[c].nunique() < 30 and eeg_df[c].dtype == object]
+# EEG grouping (condition likely exists); string-labelled group columns come
+# precomputed per dataset version, so the shared frames are never modified
+eeg_group_cols, eeg_labels = group_columns("eeg", eeg_version, eeg_df)
 # provide common choices
 default_eeg_group = None
 for guess in ["condition", "Condition", "sleep_condition", "cond", "eyes", "eyes_state"]:
@@ -200,7 +261,8 @@ for guess in ["condition", "Condition", "sleep_condition", "cond", "eyes", "eyes
 eeg_group_by = st.sidebar.selectbox("Group EEG by (for aggregation/plot)", options=[None] + eeg_group_cols, index=0 if default_eeg_group is None else (1 + eeg_group_cols.index(default_eeg_group)))
 
 # NHIS grouping (demographic)
-nhis_group_cols = [c for c in nhis_df.columns if nhis_df[c].nunique() < 200]  # include many demographic possibilities
+# include many demographic possibilities
+nhis_group_cols, nhis_labels = group_columns("nhis", nhis_version, nhis_df)
 default_nhis_group = None
 for guess in ["age_group", "agecat", "sex", "gender", "education", "race", "race_ethnicity"]:
     if guess in nhis_df.columns:
@@ -219,6 +281,9 @@ correlation_method = st.sidebar.selectbox("Distribution correlation method", ["s
 # -----------------------
 # Main layout: two columns side-by-side
 # -----------------------
+eeg_stats = group_summary("eeg", eeg_version, lab_metric, eeg_group_by, eeg_df, eeg_labels)
+nhis_stats = group_summary("nhis", nhis_version, survey_metric, nhis_group_by, nhis_df, nhis_labels)
+
 col1, col2 = st.columns([1,1])
 
 # Left: EEG visualization
@@ -228,12 +293,8 @@ with col1:
 
     # if grouping is provided: aggregate and plot grouped means
     if eeg_group_by:
-        # if group col is numeric but few unique, convert to string
-        if eeg_df[eeg_group_by].dtype != object:
-            eeg_df[eeg_group_by] = eeg_df[eeg_group_by].astype(str)
-
-        group_df = eeg_df.groupby(eeg_group_by)[lab_metric].agg([np.mean, np.std, np.median, "count"]).reset_index()
-        group_df = group_df.rename(columns={"mean": "mean", "std": "std", "median": "median", "count": "n"})
+        eeg_plot = with_group(eeg_df, eeg_labels, lab_metric, eeg_group_by)
+        group_df = eeg_stats["table"]
         st.write("Group summary:")
         st.dataframe(group_df.sort_values("mean", ascending=False))
 
@@ -243,22 +304,20 @@ with col1:
             st.plotly_chart(fig, use_container_width=True)
         else:
             # box/violin: use raw data grouped
-            fig = px.box(eeg_df, x=eeg_group_by, y=lab_metric, points="all" if show_points else "outliers", labels={eeg_group_by: labelize(eeg_group_by), lab_metric: lab_metric_label})
+            fig = px.box(eeg_plot, x=eeg_group_by, y=lab_metric, points="all" if show_points else "outliers", labels={eeg_group_by: labelize(eeg_group_by), lab_metric: lab_metric_label})
             if plot_kind == "violin":
-                fig = px.violin(eeg_df, x=eeg_group_by, y=lab_metric, box=True, points="all" if show_points else "outliers", labels={eeg_group_by: labelize(eeg_group_by), lab_metric: lab_metric_label})
+                fig = px.violin(eeg_plot, x=eeg_group_by, y=lab_metric, box=True, points="all" if show_points else "outliers", labels={eeg_group_by: labelize(eeg_group_by), lab_metric: lab_metric_label})
             st.plotly_chart(fig, use_container_width=True)
 
     else:
         # no grouping: global summary and distribution
-        desc = eeg_df[lab_metric].describe()
+        desc = eeg_stats["describe"]
         st.write("Global summary stats:")
         st.table(desc.to_frame(name=lab_metric_label).T)
         if plot_kind == "bar":
             st.info("Bar requires grouping; using binned distribution instead.")
-            # create bins
-            binned = pd.cut(eeg_df[lab_metric].dropna(), bins=8)
-            binned_counts = eeg_df.groupby(binned)[lab_metric].count().rename("count").reset_index()
-            fig = px.bar(binned_counts, x=binned_counts.index.astype(str), y="count", labels={"x":"Value bin", "count":"Count"})
+            binned_counts = eeg_stats["bins"]
+            fig = px.bar(binned_counts, x="bin", y="count", labels={"bin":"Value bin", "count":"Count"})
             st.plotly_chart(fig, use_container_width=True)
         else:
             if plot_kind == "box":
@@ -277,10 +336,8 @@ with col2:
     st.markdown(f"**Metric:** `{survey_metric}` — *{survey_metric_label}*")
 
     if nhis_group_by:
-        if nhis_df[nhis_group_by].dtype != object:
-            nhis_df[nhis_group_by] = nhis_df[nhis_group_by].astype(str)
-        group_df2 = nhis_df.groupby(nhis_group_by)[survey_metric].agg([np.mean, np.std, np.median, "count"]).reset_index()
-        group_df2 = group_df2.rename(columns={"mean":"mean", "std":"std", "median":"median", "count":"n"})
+        nhis_plot = with_group(nhis_df, nhis_labels, survey_metric, nhis_group_by)
+        group_df2 = nhis_stats["table"]
         st.write("Group summary:")
         st.dataframe(group_df2.sort_values("mean", ascending=False))
 
@@ -288,19 +345,18 @@ with col2:
             fig2 = px.bar(group_df2, x=nhis_group_by, y="mean", error_y="std", labels={nhis_group_by: labelize(nhis_group_by), "mean": survey_metric_label})
             st.plotly_chart(fig2, use_container_width=True)
         else:
-            fig2 = px.box(nhis_df, x=nhis_group_by, y=survey_metric, points="all" if show_points else "outliers", labels={nhis_group_by: labelize(nhis_group_by), survey_metric: survey_metric_label})
+            fig2 = px.box(nhis_plot, x=nhis_group_by, y=survey_metric, points="all" if show_points else "outliers", labels={nhis_group_by: labelize(nhis_group_by), survey_metric: survey_metric_label})
             if plot_kind == "violin":
-                fig2 = px.violin(nhis_df, x=nhis_group_by, y=survey_metric, box=True, points="all" if show_points else "outliers", labels={nhis_group_by: labelize(nhis_group_by), survey_metric: survey_metric_label})
+                fig2 = px.violin(nhis_plot, x=nhis_group_by, y=survey_metric, box=True, points="all" if show_points else "outliers", labels={nhis_group_by: labelize(nhis_group_by), survey_metric: survey_metric_label})
             st.plotly_chart(fig2, use_container_width=True)
     else:
-        desc2 = nhis_df[survey_metric].describe()
+        desc2 = nhis_stats["describe"]
         st.write("Global summary stats:")
         st.table(desc2.to_frame(name=survey_metric_label).T)
         if plot_kind == "bar":
             st.info("Bar requires grouping; using binned distribution instead.")
-            binned2 = pd.cut(nhis_df[survey_metric].dropna(), bins=8)
-            binned_counts2 = nhis_df.groupby(binned2)[survey_metric].count().rename("count").reset_index()
-            fig2 = px.bar(binned_counts2, x=binned_counts2.index.astype(str), y="count", labels={"x":"Value bin", "count":"Count"})
+            binned_counts2 = nhis_stats["bins"]
+            fig2 = px.bar(binned_counts2, x="bin", y="count", labels={"bin":"Value bin", "count":"Count"})
             st.plotly_chart(fig2, use_container_width=True)
         else:
             if plot_kind == "box":
@@ -325,29 +381,10 @@ Instead, this section creates *distribution-level* comparisons:
 2. We also compute a Spearman/Pearson correlation between the two selected metrics after coarse binning / resampling to produce a rough sense of co-movement across groups (conceptual only).
 """)
 
-# Strategy: create comparable group-level series if both grouped or otherwise use percentiles
-def get_grouped_series(df, metric, group_by, target_bins=8, label_prefix=""):
-    if group_by:
-        if df[group_by].dtype != object:
-            df[group_by] = df[group_by].astype(str)
-        g = df.groupby(group_by)[metric].agg(["mean", "count"]).reset_index().rename(columns={"mean": "value"})
-        g = g.sort_values("value")
-        # return series of values
-        s = g["value"].reset_index(drop=True)
-        idx = g[group_by].astype(str).reset_index(drop=True)
-        return s, idx
-    else:
-        # if no group: make binned means (e.g., quantiles)
-        ser = df[metric].dropna()
-        if ser.empty:
-            return pd.Series(dtype=float), pd.Series(dtype=str)
-        q = pd.qcut(ser, q=min(target_bins, len(ser.unique())), duplicates="drop")
-        g = ser.groupby(q).mean().reset_index(name="value")
-        idx = g[q.name].astype(str)
-        return g["value"], idx
-
-lab_series, lab_idx = get_grouped_series(eeg_df, lab_metric, eeg_group_by)
-survey_series, survey_idx = get_grouped_series(nhis_df, survey_metric, nhis_group_by)
+# Comparable group-level series: group means ascending if grouped, otherwise
+# means per quantile bin (both come with the cached group summaries above)
+lab_series, lab_idx = eeg_stats["series"], eeg_stats["series_index"]
+survey_series, survey_idx = nhis_stats["series"], nhis_stats["series_index"]
 
 # align lengths by truncating to shortest
 min_len = min(len(lab_series), len(survey_series))
@@ -359,6 +396,16 @@ st.write(f"Correlation ({correlation_method}) between the selected *group-level*
 if np.isnan(r):
     st.info("Not enough data after grouping/aggregation to compute a reliable correlation. Try different groupings or metrics.")
 else:
+    selection = (eeg_version, nhis_version, lab_metric, eeg_group_by, survey_metric, nhis_group_by)
+    unc = correlation_ci(selection, correlation_method, min_len, eeg_stats, nhis_stats,
+                         eeg_df[lab_metric], eeg_labels[eeg_group_by] if eeg_group_by else None,
+                         nhis_df[survey_metric], nhis_labels[nhis_group_by] if nhis_group_by else None)
+    level = int(unc["level"] * 100)
+    st.write(f"{level}% bootstrap CI for r: **[{unc['ci_low']:.3f}, {unc['ci_high']:.3f}]** "
+             "(rows resampled within groups, group means recomputed and re-sorted).")
+    st.caption(f"{N_RESAMPLES} seeded resamples over {unc['n']} group-level points. Both series are sorted "
+               "ascending before pairing, so r compares the shapes of the two sets of group means: "
+               "Spearman r is 1 by construction and the p-value above is not a test of association.")
     st.markdown("- Interpretation (exploratory): small absolute r implies weak association across groups; this is not a person-level correlation and cannot support causal claims.")
 
 # show a small juxtaposed line chart if lengths > 1
@@ -381,12 +428,12 @@ left_col, right_col = st.columns(2)
 
 with left_col:
     st.subheader("Sample of EEG data used")
-    st.dataframe(eeg_df[[lab_metric] + ([eeg_group_by] if eeg_group_by else [])].head(200))
-    st.download_button("Download EEG CSV (filtered view)", eeg_df.to_csv(index=False), file_name="eeg_summary_export.csv")
+    st.dataframe(with_group(eeg_df, eeg_labels, lab_metric, eeg_group_by).head(200))
+    st.download_button("Download EEG CSV (filtered view)", summary_to_csv(eeg_df), file_name="eeg_summary_export.csv")
 
 with right_col:
     st.subheader("Sample of NHIS data used")
-    st.dataframe(nhis_df[[survey_metric] + ([nhis_group_by] if nhis_group_by else [])].head(200))
+    st.dataframe(with_group(nhis_df, nhis_labels, survey_metric, nhis_group_by).head(200))
     st.download_button("Download NHIS CSV (filtered view)", nhis_df.to_csv(index=False), file_name="nhis_sleep_export.csv")
 
 # -----------------------
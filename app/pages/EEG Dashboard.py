@@ -1,15 +1,17 @@
 # -*- coding: utf-8 -*-
 # EEG Dashboard – interpretable, accessible, explainable
 
-import os
-import json
-from typing import Dict, List
+from typing import List
 
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 
+import data
+from band_cube import KEYS as CUBE_KEYS
+from eeg_summary import to_csv as summary_to_csv
+
 # =============================================================================
 # Page config
 # =============================================================================
@@ -19,65 +21,13 @@ st.title("🧠 EEG Sleep Deprivation Explorer")
 # =============================================================================
 # Paths + loaders
 # =============================================================================
-DATA_CANDIDATES = [
-    "data/clean/eeg_summary.csv",
-    "data/eeg_summary.csv",
-    "/mnt/data/eeg_summary.csv",
-]
-PARTICIPANTS_TSV_CANDIDATES = [
-    "data/raw/eeg/participants.tsv",
-    "data/participants.tsv",
-    "/mnt/data/participants.tsv",
-]
-DATA_DICTIONARY_JSON = "/mnt/data/participants.json"  # optional: field tooltips
-
-def _first_existing_path(paths: List[str]) -> str:
-    for p in paths:
-        if p and os.path.exists(p):
-            return p
-    return ""
-
-@st.cache_data
-def load_summary() -> pd.DataFrame:
-    p = _first_existing_path(DATA_CANDIDATES)
-    if not p:
-        return pd.DataFrame()
-    try:
-        df = pd.read_csv(p)
-    except Exception:
-        return pd.DataFrame()
-    return df
-
-@st.cache_data
-def load_participants_tsv() -> pd.DataFrame:
-    p = _first_existing_path(PARTICIPANTS_TSV_CANDIDATES)
-    if not p:
-        return pd.DataFrame()
-    try:
-        dfp = pd.read_csv(p, sep="\t")
-    except Exception:
-        try:
-            dfp = pd.read_csv(p)
-        except Exception:
-            return pd.DataFrame()
-    if "participant_id" in dfp.columns:
-        dfp["participant_id"] = dfp["participant_id"].astype(str)
-    return dfp
-
-@st.cache_data
-def load_data_dictionary() -> Dict[str, dict]:
-    try:
-        with open(DATA_DICTIONARY_JSON, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-df = load_summary()
-meta_df = load_participants_tsv()
-data_dict = load_data_dictionary()
+# Shared, process-wide loaders (app/data.py): one typed summary + filter index
+# per server, handed to this page as a read-only view.
+df, filter_index = data.eeg_summary_indexed()
+data_dict = data.data_dictionary()
 
 if df.empty:
-    st.error("No EEG data found. I looked for: " + ", ".join(DATA_CANDIDATES))
+    st.error("No EEG data found. I looked for: " + ", ".join(data.EEG_SUMMARY_CANDIDATES))
     st.stop()
 
 # =============================================================================
@@ -112,19 +62,47 @@ def melt_condition_wide(df_in: pd.DataFrame, base_names: List[str]) -> pd.DataFr
                 cols.append((base, suf, c))
     if not cols:
         return pd.DataFrame()
-    recs = []
-    for _, row in df_in.iterrows():
-        for base, suf, c in cols:
-            recs.append({
-                "participant_id": row.get("participant_id"),
-                "condition": suf,
-                "measure": base,
-                "value": row[c]
-            })
-    return pd.DataFrame.from_records(recs)
-
-def available(series: pd.Series) -> int:
-    return int(series.notna().sum())
+    # One row per (input row, measure, condition), input-row major: stack the
+    # value columns and flatten instead of looping over rows
+    n, k = len(df_in), len(cols)
+    pid = df_in["participant_id"].to_numpy() if "participant_id" in df_in.columns else np.full(n, None)
+    return pd.DataFrame({
+        "participant_id": np.repeat(pid, k),
+        "condition": np.tile([suf for _, suf, _ in cols], n),
+        "measure": np.tile([base for base, _, _ in cols], n),
+        "value": df_in[[c for _, _, c in cols]].to_numpy().ravel(),
+    })
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def tidy_condition_measures(filter_key: tuple, base_names: tuple, _df_in: pd.DataFrame) -> pd.DataFrame:
+    """Tidy (condition, measure) rows of `base_names` for the filtered recordings."""
+    return melt_condition_wide(_df_in, list(base_names))
+
+BAND_COLS = ["theta_mean","alpha_mean","beta_mean"]
+CONDITION_MEASURES = ["PANAS_P","PANAS_N","PVT_item1","PVT_item2","PVT_item3"]
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def dashboard_stats(filter_key: tuple, _df_filt: pd.DataFrame, _people: pd.DataFrame) -> dict:
+    """Every KPI/caption number for one filter state, from one aggregate pass per frame."""
+    wide = [f"{m}_{c}" for m in CONDITION_MEASURES for c in ("NS","SD")]
+    num_cols = [c for c in BAND_COLS + wide if c in _df_filt.columns]
+    agg = _df_filt[num_cols].agg(["count", "mean"])
+    bands = [c for c in BAND_COLS if c in _df_filt.columns]
+    missing = _df_filt[bands].isna().any(axis=1) if len(bands) == len(BAND_COLS) else None
+
+    genders = _people["Gender"].value_counts() if "Gender" in _people.columns else pd.Series(dtype=int)
+    return {
+        "participants": int(_people["participant_id"].nunique()),
+        "rows": len(_df_filt),
+        "band_available": {c: int(agg.at["count", c]) if c in agg else 0 for c in BAND_COLS},
+        "band_missing_rows": _df_filt.loc[missing] if missing is not None else None,
+        # Same as grouping the tidy PANAS/PVT frame by condition: mean of each wide column
+        "condition_means": {m: {c: agg.at["mean", f"{m}_{c}"] for c in ("NS","SD") if f"{m}_{c}" in agg}
+                            for m in CONDITION_MEASURES},
+        "mean_age": _people["Age"].mean() if "Age" in _people.columns else np.nan,
+        "sex_counts": {g: int(genders.get(g, 0)) for g in ("F","M")},
+        "session_orders": sorted(_people.get("SessionOrder", pd.Series(dtype=str)).dropna().unique().tolist()),
+    }
 
 # =============================================================================
 # Sidebar filters
@@ -158,21 +136,21 @@ age_range = st.sidebar.slider("Age range", min_value=age_min, max_value=age_max,
 gender_vals = sorted([g for g in df.get("Gender", pd.Series(dtype=str)).dropna().unique().tolist() if g])
 gender_sel = st.sidebar.multiselect("Sex", gender_vals, default=gender_vals, help=tip("Gender","Biological sex as recorded."))
 
-# Apply filters to rows (session×task)
-mask = pd.Series(True, index=df.index)
-if "condition" in df.columns:
-    mask &= df["condition"].isin(conds_selected)
-if "task" in df.columns:
-    mask &= df["task"].isin(tasks_selected)
-if "Age" in df.columns:
-    mask &= df["Age"].between(age_range[0], age_range[1])
-if "Gender" in df.columns and gender_vals:
-    mask &= df["Gender"].isin(gender_sel) if gender_sel else True
-df_filt = df.loc[mask].copy()
+# Apply filters to rows (session×task); unindexed (absent) columns match everything
+row_filters = {"condition": conds_selected, "task": tasks_selected}
+if gender_vals and gender_sel:
+    row_filters["Gender"] = gender_sel
+rows_sel = filter_index.select(isin=row_filters, between={"Age": age_range})
+df_filt = filter_index.take(df, rows_sel)
+# Everything derived from df_filt can be memoized on this (summary version + sidebar state):
+# the cached helpers above take it as their key and the frames as _-prefixed
+# arguments, which st.cache_data does not hash
+filter_key = (data.file_mtime(data.eeg_summary_path()),
+              tuple(conds_selected), tuple(tasks_selected), tuple(age_range), tuple(gender_sel))
 
 # A de-duplicated participant slice for cohort-level KPIs (avoid double-counting)
-people = (df_filt.sort_values("participant_id")
-                 .drop_duplicates(subset="participant_id"))
+people = filter_index.take(df, filter_index.first_per_group(rows_sel))
+stats = dashboard_stats(filter_key, df_filt, people)
 
 # =============================================================================
 # Data quality header
@@ -180,21 +158,20 @@ people = (df_filt.sort_values("participant_id")
 st.subheader("Data quality snapshot")
 cards = st.columns(5)
 with cards[0]:
-    kpi_card("Participants", f"{people['participant_id'].nunique()}")
+    kpi_card("Participants", f"{stats['participants']}")
 with cards[1]:
-    kpi_card("Records (rows)", f"{len(df_filt)}", "One row = one session×task")
+    kpi_card("Records (rows)", f"{stats['rows']}", "One row = one session×task")
 with cards[2]:
-    kpi_card("Theta avail", f"{available(df_filt.get('theta_mean', pd.Series(dtype=float)))}")
+    kpi_card("Theta avail", f"{stats['band_available']['theta_mean']}")
 with cards[3]:
-    kpi_card("Alpha avail", f"{available(df_filt.get('alpha_mean', pd.Series(dtype=float)))}")
+    kpi_card("Alpha avail", f"{stats['band_available']['alpha_mean']}")
 with cards[4]:
-    kpi_card("Beta avail",  f"{available(df_filt.get('beta_mean',  pd.Series(dtype=float)))}")
+    kpi_card("Beta avail",  f"{stats['band_available']['beta_mean']}")
 
-needs = ["theta_mean","alpha_mean","beta_mean"]
-if any(c not in df_filt.columns for c in needs):
+missing_rows = stats["band_missing_rows"]
+if missing_rows is None:
     st.info("Some EEG band columns are missing from this dataset.")
 else:
-    missing_rows = df_filt[df_filt[needs].isna().any(axis=1)]
     if len(missing_rows) == 0:
         st.success("All selected rows include theta, alpha, and beta.")
     else:
@@ -243,7 +220,7 @@ with st.expander("Why this chart?", expanded=False):
         "Overlaying dots keeps individuals visible (great for small samples)."
     )
 
-panas_tidy = melt_condition_wide(df_filt, ["PANAS_P","PANAS_N"])
+panas_tidy = tidy_condition_measures(filter_key, ("PANAS_P","PANAS_N"), df_filt)
 if not panas_tidy.empty:
     col_choice = st.radio(
         "Which mood scores to view?",
@@ -267,8 +244,8 @@ if not panas_tidy.empty:
         st.caption("Each dot is one participant’s score under that condition.")
 
         # Quick summary (means)
-        g = pdat.groupby("condition")["value"].mean()
-        if "NS" in g and "SD" in g:
+        g = stats["condition_means"][which]
+        if pd.notna(g.get("NS")) and pd.notna(g.get("SD")):
             diff = g["SD"] - g["NS"]
             arrow = "↑" if diff > 0 else "↓" if diff < 0 else "→"
             st.caption(f"**Summary** - Mean {col_choice.split()[0]}: NS = {g['NS']:.1f}, SD = {g['SD']:.1f}. SD–NS: {diff:+.1f} ({arrow}).")
@@ -302,7 +279,7 @@ with st.expander("Why use a violin plot here?", expanded=False):
         "A **violin plot** shows both the distribution shape and summary stats, which a box alone can hide."
     )
 
-pvt_tidy = melt_condition_wide(df_filt, ["PVT_item1","PVT_item2","PVT_item3"])
+pvt_tidy = tidy_condition_measures(filter_key, ("PVT_item1","PVT_item2","PVT_item3"), df_filt)
 if not pvt_tidy.empty:
     metric_map = {
         "Lapses (count)": "PVT_item1",
@@ -325,8 +302,8 @@ if not pvt_tidy.empty:
         st.plotly_chart(fig, use_container_width=True)
         st.caption("Each dot is one participant’s value under that condition.")
 
-        g = pdata.groupby("condition")["value"].mean()
-        if "NS" in g and "SD" in g:
+        g = stats["condition_means"][which_key]
+        if pd.notna(g.get("NS")) and pd.notna(g.get("SD")):
             diff = g["SD"] - g["NS"]
             arrow = "↑" if diff > 0 else "↓" if diff < 0 else "→"
             st.caption(f"**Summary** - Mean {which_label}: NS = {g['NS']:.0f}, SD = {g['SD']:.0f}. SD–NS: {diff:+.0f} ({arrow}).")
@@ -390,6 +367,30 @@ if band_cols:
 else:
     st.info("No EEG band columns found.")
 
+# Region-level band power from the precomputed cube (scripts/build_eeg_summary.py)
+band_cube = data.band_cube()
+st.markdown("#### Band power by region")
+if band_cube is None:
+    st.caption("Region-level band power is not available yet (run scripts/build_eeg_summary.py).")
+elif all(k in df_filt.columns for k in CUBE_KEYS):
+    region_band = st.radio("Band", [b.title() for b in band_cube.bands], horizontal=True, key="region_band")
+    band = region_band.lower()
+    regions = band_cube.table("region")
+    regions[CUBE_KEYS] = regions[CUBE_KEYS].astype(str)
+    region_df = regions.merge(df_filt[CUBE_KEYS + ["condition"]], on=CUBE_KEYS, how="inner")
+    region_df = region_df.dropna(subset=[band])
+    if region_df.empty:
+        st.info("No region-level band power for the current filters.")
+    else:
+        fig = px.box(
+            region_df, x="name", y=band, color="condition", points="all",
+            color_discrete_map={"NS": PALETTE["NS"], "SD": PALETTE["SD"]},
+            labels={"name": "", band: f"{region_band} power (dB)"}
+        )
+        fig.update_layout(height=420, boxmode="group")
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption("Each dot is one recording’s average over the channels in that region.")
+
 st.divider()
 
 # =============================================================================
@@ -398,16 +399,14 @@ st.divider()
 st.subheader("Cohort characteristics")
 ccols = st.columns(4)
 with ccols[0]:
-    mean_age = people["Age"].mean() if "Age" in people.columns else np.nan
+    mean_age = stats["mean_age"]
     kpi_card("Mean age", f"{mean_age:.1f}" if pd.notna(mean_age) else "-")
 with ccols[1]:
-    f_count = people.loc[people["Gender"].eq("F")] if "Gender" in people.columns else pd.DataFrame()
-    kpi_card("Female participants", f"{f_count['participant_id'].nunique() if not f_count.empty else 0}")
+    kpi_card("Female participants", f"{stats['sex_counts']['F']}")
 with ccols[2]:
-    m_count = people.loc[people["Gender"].eq("M")] if "Gender" in people.columns else pd.DataFrame()
-    kpi_card("Male participants", f"{m_count['participant_id'].nunique() if not m_count.empty else 0}")
+    kpi_card("Male participants", f"{stats['sex_counts']['M']}")
 with ccols[3]:
-    sess_orders = ", ".join(sorted(people.get("SessionOrder", pd.Series(dtype=str)).dropna().unique().tolist()))
+    sess_orders = ", ".join(stats["session_orders"])
     kpi_card("Session orders", sess_orders if sess_orders else "-")
 
 st.markdown("#### Participants")
@@ -421,7 +420,8 @@ def build_availability_grid(df_in: pd.DataFrame) -> pd.DataFrame:
         return df_in[cols_base].drop_duplicates().sort_values("participant_id")
 
     df_small = df_in[cols_base + ["session","task","condition"]].copy()
-    df_small["slot"] = df_small["condition"].map({"NS":"NS","SD":"SD"}) + " • " + df_small["task"].map({"eyesopen":"eyes open","eyesclosed":"eyes closed"})
+    df_small["slot"] = (df_small["condition"].map({"NS":"NS","SD":"SD"}).astype(str) + " • "
+                        + df_small["task"].map({"eyesopen":"eyes open","eyesclosed":"eyes closed"}).astype(str))
     slots = ["NS • eyes closed","NS • eyes open","SD • eyes closed","SD • eyes open"]
 
     pivot = (df_small.assign(available="✓")
@@ -450,7 +450,7 @@ else:
     st.dataframe(df_filt[show_cols].sort_values(["participant_id","session","task"]), use_container_width=True)
     st.download_button(
         "Download (long CSV)",
-        data=df_filt.to_csv(index=False).encode("utf-8"),
+        data=summary_to_csv(df_filt).encode("utf-8"),
         file_name="eeg_summary_filtered.csv",
         mime="text/csv"
     )
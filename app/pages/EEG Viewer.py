@@ -4,13 +4,23 @@
 
 import os
 import re
+import time
 import base64
 import xml.etree.ElementTree as ET
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
-from huggingface_hub import hf_hub_download, list_repo_files
+
+from recordings import DATA_SUFFIX, TIME_COL, RecordingReader
+from disk_cache import RecordingCache
+from downsample import downsample
+import data
+from montage import REGION_MAP
+from remote import (
+    INDEX_TTL_SEC, Prefetcher, build_recording_index, list_remote_files, recording_files,
+)
 
 # =============================================================================
 # App setup
@@ -18,6 +28,16 @@ from huggingface_hub import hf_hub_download, list_repo_files
 HF_REPO = "aparker03/eeg-csv"
 DATA_DIR = "data/eeg_csv"
 os.makedirs(DATA_DIR, exist_ok=True)
+# Downloaded recordings are kept in an LRU cache capped at this many bytes. It
+# has its own directory: recordings exported locally into DATA_DIR
+# (scripts/export_eeg_csv.py) are read in place and never evicted.
+CACHE_DIR = os.path.join(DATA_DIR, "hub_cache")
+CACHE_MAX_BYTES = int(float(os.environ.get("EEG_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+# Signal plot: traces are decimated server-side to about this many points,
+# i.e. two (min + max) per horizontal pixel of a typical wide plot.
+PLOT_WIDTH_PX = 1200
+DETAIL_PRESETS = {"Standard": 2 * PLOT_WIDTH_PX, "High": 4 * PLOT_WIDTH_PX, "Low": PLOT_WIDTH_PX}
 
 st.set_page_config(page_title="EEG Channel Explorer", layout="wide")
 st.title("🧠 EEG Channel Explorer")
@@ -206,16 +226,14 @@ SVG_POS = {k: (x, y) for k, (x, y) in SVG_POS_RAW.items()}
 # =============================================================================
 # Channel coordinate CSV (PRIMARY)
 # =============================================================================
-COORDS_PATH = "data/clean/eeg_channel_coordinates.csv"
-
 @st.cache_data
-def _load_coords_csv(path: str):
-    if not os.path.exists(path):
-        return {}, None
+def _load_coords_csv(path: str, mtime: float):
     try:
-        df = pd.read_csv(path)
+        df = data.channel_coordinates(path)
     except Exception:
         return {}, None
+    if df is None:
+        return {}, None
     label_col = next((c for c in df.columns if str(c).lower() in ["label","channel","chan","name"]), None)
     x_col     = next((c for c in df.columns if str(c).lower() in ["x","cx","xcoord","x_pos"]), None)
     y_col     = next((c for c in df.columns if str(c).lower() in ["y","cy","ycoord","y_pos"]), None)
@@ -236,7 +254,7 @@ def _load_coords_csv(path: str):
         pos[_norm_label(r[label_col])] = (xn, yn)
     return pos, (label_col, x_col, y_col)
 
-COORD_POS, COORD_COLUMNS = _load_coords_csv(COORDS_PATH)
+COORD_POS, COORD_COLUMNS = _load_coords_csv(data.COORDS_PATH, data.file_mtime(data.COORDS_PATH))
 USE_COORDS = bool(COORD_POS)
 
 def get_xy(label: str):
@@ -250,13 +268,7 @@ def get_xy(label: str):
 # =============================================================================
 # Region membership and colors
 # =============================================================================
-REGION_MAP = {
-    "Frontal":   ["Fp1","Fp2","Fpz","AFz","AF3","AF4","AF7","AF8","F1","F2","F3","F4","F7","F8","Fz"],
-    "Central":   ["FC1","FC2","FCz","C1","C2","C3","C4","Cz"],
-    "Parietal":  ["CP1","CP2","CPz","P1","P2","P3","P4","P7","P8","Pz","POz"],
-    "Occipital": ["PO3","PO4","PO7","PO8","O1","Oz","O2"],
-    "Temporal":  ["T7","T8","T9","T10","FT7","FT8","TP7","TP8","TP9","TP10"],
-}
+# REGION_MAP lives in montage.py (shared with the band-power cube builder)
 # High-contrast, color-blind–friendly choices
 REGION_COLOR = {
     "Frontal":   "#1f77b4",  # blue
@@ -347,7 +359,7 @@ def channel_explainer(label: str):
 # =============================================================================
 # Brain map renderer
 # =============================================================================
-def build_brain_map(selected_channels, regions_to_draw, svg_bytes):
+def build_brain_map(selected_channels, regions_to_draw, svg_bytes, channel_power=None, band_label=""):
     fig = go.Figure()
     fig.update_layout(paper_bgcolor="white", plot_bgcolor="white")
 
@@ -373,6 +385,19 @@ def build_brain_map(selected_channels, regions_to_draw, svg_bytes):
             showlegend=False
         ))
 
+    # Optional band-power shading: every channel in the recording, colored by dB
+    if channel_power:
+        pts = [(ch, get_xy(ch), v) for ch, v in channel_power.items()]
+        pts = [(ch, xy, v) for ch, xy, v in pts if xy and np.isfinite(v)]
+        if pts:
+            fig.add_trace(go.Scatter(
+                x=[xy[0] for _, xy, _ in pts], y=[xy[1] for _, xy, _ in pts], mode="markers",
+                marker=dict(size=13, color=[v for _, _, v in pts], colorscale="Viridis",
+                            colorbar=dict(title=f"{band_label} (dB)", thickness=12)),
+                text=[f"{ch}: {v:.1f} dB" for ch, _, v in pts],
+                hoverinfo="text", showlegend=False
+            ))
+
     # Dots only for selected channels
     if selected_channels:
         def color_for_channel(ch):
@@ -424,60 +449,39 @@ if "region_mode" not in st.session_state:
 # =============================================================================
 # Participants metadata
 # =============================================================================
-def _first_existing_path(paths):
-    for p in paths:
-        if os.path.exists(p):
-            return p
-    return None
-
-_PARTICIPANTS_PATH = _first_existing_path([
-    "data/raw/eeg/participants.tsv",
-    "data/participants.tsv"
-])
-
-@st.cache_data
-def load_participants(path):
-    if not path:
-        return pd.DataFrame()
-    try:
-        dfp = pd.read_csv(path, sep="\t")
-    except Exception:
-        dfp = pd.read_csv(path)
-    if "participant_id" in dfp.columns:
-        dfp["participant_id_norm"] = (
-            dfp["participant_id"].astype(str).str.replace("sub-", "", regex=False)
-        )
-    for col in [c for c in dfp.columns if "EEG_SamplingTime" in c]:
-        dfp[col + "_hour"] = pd.to_datetime(dfp[col], errors="coerce", format="%H:%M").dt.hour
-    return dfp
-
-meta = load_participants(_PARTICIPANTS_PATH)
+# Participant columns of the shared typed EEG summary (participants.tsv when the
+# summary has not been built); a view, so the column added here stays local
+meta = data.eeg_participants()
+if "participant_id" in meta.columns:
+    meta["participant_id_norm"] = meta["participant_id"].astype(str).str.replace("sub-", "", regex=False)
 
 # =============================================================================
 # Index remote EEG files
 # =============================================================================
-try:
-    all_files = list_repo_files(repo_id=HF_REPO, repo_type="dataset")
-except Exception:
-    all_files = []
-
-csv_files = [f for f in all_files if f.endswith(".csv")]
-if not csv_files:
-    st.error("No EEG CSV files found in the remote dataset. Check the Hugging Face path or your connection.")
+# Listing is persisted under CACHE_DIR with a TTL; reruns reuse the in-memory copy.
+# An offline fallback ("stale"/"local") is only kept for OFFLINE_RETRY_SEC, so
+# the real listing comes back soon after connectivity does.
+OFFLINE_RETRY_SEC = 30
+
+@st.cache_data(ttl=INDEX_TTL_SEC, show_spinner=False)
+def load_remote_index(repo_id: str):
+    files, source = list_remote_files(repo_id, CACHE_DIR, local_dirs=[DATA_DIR])
+    return frozenset(files), build_recording_index(files), source, time.time()
+
+_all_files_set, recording_index, index_source, _index_loaded_at = load_remote_index(HF_REPO)
+if index_source in ("stale", "local") and time.time() - _index_loaded_at > OFFLINE_RETRY_SEC:
+    load_remote_index.clear(HF_REPO)
+    _all_files_set, recording_index, index_source, _index_loaded_at = load_remote_index(HF_REPO)
+if not recording_index:
+    st.error("No EEG recording files found in the remote dataset. Check the Hugging Face path or your connection.")
     st.stop()
+if index_source in ("stale", "local"):
+    st.caption("Offline: showing recordings from the last saved file list.")
 
-all_subject_ids = sorted({f.split("_")[0].replace("sub-", "") for f in csv_files})
+all_subject_ids = sorted(recording_index.keys())
 
 def available_for_subject(subj_id: str):
-    prefix = f"sub-{subj_id}_"
-    avail = {}
-    for f in csv_files:
-        if f.startswith(prefix):
-            parts = f.replace(prefix, "").split(".csv")[0].split("_")
-            if len(parts) == 2:
-                session, task = parts
-                avail[(session, task)] = f
-    return avail
+    return recording_index.get(subj_id, {})
 
 # =============================================================================
 # Sidebar: Participant Finder
@@ -485,6 +489,10 @@ def available_for_subject(subj_id: str):
 st.sidebar.header("Find a participant")
 st.sidebar.caption("Use filters to narrow the subject list. The viewer shows one subject at a time.")
 show_group = st.sidebar.checkbox("Show group snapshot while filtering", value=False)
+prefetch_next = st.sidebar.checkbox(
+    "Prefetch next participant", value=True,
+    help="Download the next participant's recordings in the background."
+)
 
 eligible_subjects = all_subject_ids.copy()
 
@@ -551,7 +559,7 @@ if show_group and not meta.empty and "participant_id_norm" in meta.columns:
             if "Age" in current_pool.columns and current_pool["Age"].notna().any():
                 cols[1].metric("Mean age (years)", f"{round(current_pool['Age'].mean(), 1)}")
             if "Gender" in current_pool.columns:
-                g_counts = current_pool["Gender"].value_counts().to_dict()
+                g_counts = current_pool["Gender"].value_counts().loc[lambda v: v > 0].to_dict()
                 cols[2].metric("Sex counts", ", ".join(f"{k}:{v}" for k, v in g_counts.items()))
             suf = "NS" if selected_cond == "Normal Sleep (NS)" else "SD"
             metric_cols = [f"PANAS_P_{suf}", f"PANAS_N_{suf}",
@@ -611,9 +619,6 @@ task_map = {"Eyes Open": "eyesopen", "Eyes Closed": "eyesclosed"}
 subj_str = f"sub-{selected_subj}"
 session_str = cond_map[selected_cond]
 task_str = task_map[selected_task]
-filename = f"{subj_str}_{session_str}_{task_str}.csv"
-file_path = os.path.join(DATA_DIR, filename)
-
 avail = available_for_subject(selected_subj)
 if (session_str, task_str) not in avail:
     req_line = f"You asked for: {pretty_condition_suffix('SD' if session_str=='ses-2' else 'NS')} ({session_str}) • {'Eyes Open' if task_str=='eyesopen' else 'Eyes Closed'}"
@@ -635,14 +640,51 @@ if (session_str, task_str) not in avail:
     )
     st.stop()
 
-if not os.path.exists(file_path):
-    with st.spinner(f"Fetching {filename}..."):
+# One cache + downloader per server process, so sessions share in-flight downloads
+@st.cache_resource(show_spinner=False)
+def get_prefetcher(repo_id: str) -> Prefetcher:
+    return Prefetcher(repo_id, RecordingCache(CACHE_DIR, CACHE_MAX_BYTES, on_evict=_close_evicted))
+
+def _close_evicted(path: str, st: os.stat_result):
+    # Drop the open_recording entry of an evicted file so its memory map is
+    # released and the disk space is actually freed
+    open_recording.clear(path, (st.st_ino, st.st_size))
+
+def exported_locally(filenames) -> bool:
+    return all(os.path.exists(os.path.join(DATA_DIR, f)) for f in filenames)
+
+prefetcher = get_prefetcher(HF_REPO)
+
+filename = avail[(session_str, task_str)]
+needed_files = recording_files(filename, _all_files_set)
+
+# Queue this selection first, then the subject's other session×task recordings
+# (and optionally the next subject's) so switching condition/task is instant.
+# Local exports are used as they are and never downloaded.
+if exported_locally(needed_files):
+    file_path, pending = os.path.join(DATA_DIR, filename), []
+else:
+    file_path = prefetcher.cache.path(filename)
+    pending = [prefetcher.fetch_async(f) for f in needed_files]
+neighbour_recordings = [fn for fn in sorted(avail.values()) if fn != filename]
+if prefetch_next:
+    pos = eligible_subjects.index(selected_subj)
+    if pos + 1 < len(eligible_subjects):
+        neighbour_recordings.extend(available_for_subject(eligible_subjects[pos + 1]).values())
+neighbours = []
+for fn in neighbour_recordings:
+    files = recording_files(fn, _all_files_set)
+    if not exported_locally(files):
+        neighbours.extend(files)
+if index_source not in ("stale", "local"):  # don't queue doomed downloads offline
+    prefetcher.prefetch(neighbours)
+
+for fname, fut in zip(needed_files, pending):
+    if fut.done() and fut.exception() is None:
+        continue
+    with st.spinner(f"Fetching {fname}..."):
         try:
-            downloaded = hf_hub_download(
-                repo_id=HF_REPO, filename=filename, repo_type="dataset",
-                local_dir=DATA_DIR, local_dir_use_symlinks=False
-            )
-            file_path = downloaded
+            fut.result()
         except Exception as e:
             st.error(
                 "Could not download the EEG file for this selection. "
@@ -651,9 +693,30 @@ if not os.path.exists(file_path):
             )
             st.stop()
 
-# Load data
+with st.sidebar.expander("Recording cache", expanded=False):
+    cs = prefetcher.cache.stats()
+    st.caption(f"{cs['files']} files • {cs['bytes'] / 1e6:.0f} of {cs['max_bytes'] / 1e6:.0f} MB")
+    st.caption(f"Hits: {cs['hits']} • Misses: {cs['misses']} • Evictions: {cs['evictions']}")
+
+# Load data. Shared across sessions: binary recordings stay memory-mapped, so
+# concurrent viewers of the same file share the OS page cache.
+@st.cache_resource(show_spinner=False, max_entries=32)
+def open_recording(path: str, file_id: tuple) -> RecordingReader:
+    if path.endswith(DATA_SUFFIX):
+        return RecordingReader.open(path[:-len(DATA_SUFFIX)])
+    df_csv = pd.read_csv(path)
+    if TIME_COL not in df_csv.columns:
+        raise KeyError(TIME_COL)
+    return RecordingReader.from_frame(df_csv)
+
 try:
-    df = pd.read_csv(file_path)
+    # Keyed on inode + size: the cache touches mtime on every hit, a re-download
+    # gets a new inode. Evicted files are cleared from here (_close_evicted).
+    _st = os.stat(file_path)
+    recording = open_recording(file_path, (_st.st_ino, _st.st_size))
+except KeyError:
+    st.error("This file is missing the 'Time' column expected by the viewer. Try another recording.")
+    st.stop()
 except Exception as e:
     st.error(
         "Found the file but could not read it. The file may be corrupted. Try another selection.\n\n"
@@ -661,14 +724,8 @@ except Exception as e:
     )
     st.stop()
 
-time_col = "Time"
-if time_col not in df.columns:
-    st.error("This file is missing the 'Time' column expected by the viewer. Try another recording.")
-    st.stop()
-
 # Confirm at least one nonempty EEG column exists
-all_cols = [c for c in df.columns if c != time_col]
-nonempty_channels_in_file = [c for c in all_cols if df[c].notna().any()]
+nonempty_channels_in_file = recording.nonempty_channels
 if not nonempty_channels_in_file:
     st.info("This recording does not contain usable EEG channels. Try a different task or condition for this participant.")
     st.stop()
@@ -759,22 +816,76 @@ if st.session_state.region_mode == "All" and not st.session_state.selected_regio
 else:
     regions_to_draw = st.session_state.selected_regions
 
+# Band power per channel/region comes precomputed from the band-power cube
+# (scripts/build_eeg_summary.py)
+band_cube = data.band_cube()
+
 show_map = st.checkbox("Show brain map", value=True)
 if show_map:
+    channel_power, band_label, region_power = None, "", None
+    if band_cube is not None:
+        mcols = st.columns([1, 2])
+        shade = mcols[0].checkbox("Shade by band power", value=False,
+                                  help="Color every channel by its average power in one band for this recording.")
+        if shade:
+            band_label = mcols[1].radio("Band", [b.title() for b in band_cube.bands], horizontal=True)
+            band = band_label.lower()
+            ch_df = band_cube.recording(subj_str, session_str, task_str, level="channel")
+            channel_power = ch_df[band].astype(float).to_dict()
+            region_power = band_cube.recording(subj_str, session_str, task_str, level="region")[band]
+            region_power = region_power.reindex([r for r in REGION_MAP if r in region_power.index])
     st.plotly_chart(
-        build_brain_map(selected_channels, regions_to_draw, SVG_BYTES),
+        build_brain_map(selected_channels, regions_to_draw, SVG_BYTES, channel_power, band_label),
         use_container_width=True
     )
     st.caption("Top view. Forehead at the top, back of head at the bottom. Channel dot positions are approximate.")
+    if region_power is not None:
+        if len(region_power):
+            st.caption(f"{band_label} power by region: " +
+                       " • ".join(f"{r} {v:.1f} dB" for r, v in region_power.items()))
+        else:
+            st.caption("No band power precomputed for this recording yet.")
 
 # =============================================================================
 # Signal plot
 # =============================================================================
 if selected_channels:
+    t_start = recording.t0
+    t_end = recording.t0 + recording.duration
+    window = st.slider(
+        "Time window (s)", min_value=float(t_start), max_value=float(t_end),
+        value=(float(t_start), float(t_end)), step=0.5,
+        help="Only the selected channels over this window are read from the recording."
+    )
+    dcols = st.columns(2)
+    detail = dcols[0].radio("Plot detail", list(DETAIL_PRESETS.keys()), horizontal=True,
+                            help="Points sent per channel. Narrow the time window to see every sample.")
+    method_label = dcols[1].radio("Downsampling", ["Min-max (keeps peaks)", "LTTB (keeps shape)"],
+                                  horizontal=True)
+    max_points = DETAIL_PRESETS[detail]
+    method = "minmax" if method_label.startswith("Min-max") else "lttb"
+
+    plot_channels = [ch for ch in selected_channels if ch in recording.channels]
+    w_start, w_stop = recording.sample_range(window[0], window[1])
+    n_window = w_stop - w_start
     fig = go.Figure()
-    for ch in selected_channels:
-        if ch in df.columns:
-            fig.add_trace(go.Scatter(x=df[time_col], y=df[ch], mode="lines", name=ch))
+    # Min-max at any zoom comes straight from the precomputed pyramid when there
+    # is one; otherwise read the raw window and decimate it here.
+    envelope = None
+    if method == "minmax":
+        envelope = recording.read_envelope(plot_channels, window[0], window[1], max_points)
+    if envelope is not None:
+        times, samples = envelope
+        n_shown = len(times)
+        for ch, y in zip(plot_channels, samples):
+            fig.add_trace(go.Scattergl(x=times, y=y, mode="lines", name=ch))
+    else:
+        times, samples = recording.read(plot_channels, tmin=window[0], tmax=window[1])
+        n_shown = 0
+        for ch, y in zip(plot_channels, samples):
+            x_ds, y_ds = downsample(times, y, max_points, method=method)
+            n_shown = max(n_shown, len(x_ds))
+            fig.add_trace(go.Scattergl(x=x_ds, y=y_ds, mode="lines", name=ch))
     fig.update_layout(
         title=pretty_title(subj_str, selected_cond, selected_task),
         xaxis_title="Time (s)",
@@ -782,4 +893,7 @@ if selected_channels:
         height=600
     )
     st.plotly_chart(fig, use_container_width=True)
+    if n_shown < n_window:
+        st.caption(f"Showing {n_shown:,} points for {n_window:,} samples per channel. "
+                   "Narrow the time window to zoom in at full resolution.")
 
@@ -1,7 +1,12 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import altair as alt
 
+import chart_data
+import data
+import survey
+
 # --- Variable Descriptions ---
 nhisVarDesc = {
     'SLPMEDINTRO_A': 'The next three questions are about sleep medications and supplements. For the first two questions, do not include marijuana or CBD products.',
@@ -177,19 +182,23 @@ st.markdown("---")
 
 
 # --- Load Data ---
-@st.cache_data
-def load_sleep_data():
-    df = pd.read_csv("data/clean/nhis_sleep_demo_clean.csv")
-
-    # Filter out refused, not ascertained, and don't know responses for education
-    # Assuming these are coded as 97, 98, 99 or similar high values
-    # Keep only education levels 0-10 (valid responses)
-    df = df[df['EDUCP_A'].isin(range(0, 11))]
-
-    return df
-
-
-df = load_sleep_data()
+def load_sleep_data(years):
+    # Shared process-wide copy (app/data.py) of the selected survey-year
+    # partitions. Every respondent is kept (unanswered items are missing), so
+    # the filters below select a domain within the full survey design.
+    return data.nhis_summary(years, design=True)
+
+
+available_years = data.nhis_years()
+if len(available_years) > 1:
+    selected_years = st.multiselect("Survey Year(s)", options=available_years,
+                                    default=available_years[-1:], key="year_multiselect")
+else:
+    selected_years = available_years
+df = load_sleep_data(selected_years)
+if df is None:
+    st.warning("No NHIS data for the selected survey year(s).")
+    st.stop()
 
 # --- Filter Controls (On-Page) ---
 st.markdown("### 🎚️ Filter Options")
@@ -259,11 +268,90 @@ with col3:
         selected_edu_codes.append(code)
 
 # --- Apply Filters ---
-filtered_df = df[
+filter_mask = (
     (df["AGEP_A"].between(age_filter[0], age_filter[1])) &
     (df["SEX_A"].isin(selected_sex_codes)) &
     (df["EDUCP_A"].isin(selected_edu_codes))
-    ]
+)
+filtered_df = df[filter_mask]
+# Cache key for everything derived from the filtered data (data version + filter
+# state). The memoized helpers below take it as their first argument and the
+# frame/mask as _-prefixed arguments, which st.cache_data does not hash.
+filter_key = (data.nhis_version(selected_years), age_filter, tuple(selected_sex_codes), tuple(selected_edu_codes))
+
+# --- Survey-weighted estimates ---
+OFTEN_ALWAYS = [4, 5]
+AGE_BINS = [float("-inf"), 30, 40, 50, 60, 70, float("inf")]
+AGE_GROUPS = ["18-29", "30-39", "40-49", "50-59", "60-69", "70+"]
+SLEEP_AID_LABELS = {
+    'SLPMED1_A': 'Prescription Sleep Medication',
+    'SLPMED2_A': 'OTC Sleep Aids/Supplements',
+    'SLPMED3_A': 'Marijuana/CBD Products'
+}
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def survey_estimates(filter_key: tuple, _df: pd.DataFrame, _domain) -> pd.DataFrame:
+    """Weighted KPI estimates (survey.py) for one filter state, in one pass.
+
+    The filter is a domain of the full sample, so SEs reflect the survey design.
+    """
+    values = {"SLPHOURS_A": _df["SLPHOURS_A"].to_numpy(dtype=float),
+              "SLPFLL_A": survey.indicator(_df["SLPFLL_A"], OFTEN_ALWAYS)}
+    for col in SLEEP_AID_LABELS:
+        if col in _df.columns:
+            values[col] = survey.indicator(_df[col], OFTEN_ALWAYS)
+    return survey.estimate(_df, values, _domain)
+
+
+estimates = survey_estimates(filter_key, df, filter_mask.to_numpy())
+weighted = survey.has_design(df)
+ESTIMATE_NOTE = (
+    "Population estimates: weighted by WTFA_A, standard errors from the survey design (PSTRAT/PPSU)."
+    if weighted else
+    "Unweighted sample values: this extract has no survey weights (re-run scripts/extract_clean_sleep_demo.py)."
+)
+
+
+# --- Sleep aid usage by age group ---
+@st.cache_data(show_spinner=False, max_entries=64)
+def sleep_aid_usage(filter_key: tuple, _df: pd.DataFrame, _domain) -> pd.DataFrame:
+    """Often/Always share of each sleep aid per age group (weighted, with SEs), plus raw counts.
+
+    Only age groups with respondents in the filter are returned.
+    """
+    cols = [c for c in SLEEP_AID_LABELS if c in _df.columns]
+    age_group = pd.cut(_df["AGEP_A"], bins=AGE_BINS, right=False, labels=AGE_GROUPS).rename("Age_Group")
+    users = pd.DataFrame({c: survey.indicator(_df[c], OFTEN_ALWAYS) for c in cols}, index=_df.index)
+    usage = survey.estimate(_df, {c: users[c].to_numpy() for c in cols}, _domain, by=age_group)
+    usage = usage[usage["n"] > 0]
+    in_domain = np.asarray(_domain, dtype=bool)
+    users_count = (users[in_domain].groupby(age_group[in_domain], observed=True).sum()
+                   .stack().rename_axis(["Age_Group", "variable"]).rename("Users_Count").reset_index()
+                   .astype({"Age_Group": str}))
+    usage = usage.astype({"Age_Group": str}).merge(users_count, on=["Age_Group", "variable"], how="left")
+    return pd.DataFrame({
+        'Age_Group': usage["Age_Group"],
+        'Sleep_Aid_Type': usage["variable"].map(SLEEP_AID_LABELS),
+        'Usage_Percentage': usage["estimate"] * 100,
+        'Usage_SE': usage["se"] * 100,
+        'Users_Count': usage["Users_Count"].fillna(0).astype(int),
+        'Total_Count': usage["n"],
+    })
+
+
+# --- Chart data (aggregated here so the charts get bins, not respondents) ---
+@st.cache_data(show_spinner=False, max_entries=64)
+def chart_frames(filter_key: tuple, _df: pd.DataFrame) -> dict:
+    """Histogram, age × hours density and regression line for one filter state."""
+    line, fit = chart_data.regression_line(_df["AGEP_A"], _df["SLPHOURS_A"])
+    return {
+        "hours_hist": chart_data.histogram(_df["SLPHOURS_A"], maxbins=20),
+        "age_hours": chart_data.histogram_2d(_df["AGEP_A"], _df["SLPHOURS_A"]),
+        "age_hours_fit": line,
+        "age_hours_fit_stats": fit,
+    }
+
 
 # --- Frequency label map ---
 sleep_freq_labels = {
@@ -290,11 +378,16 @@ with tab1:
 
     with col2:
         st.markdown("#### Summary Stats")
-        avg_sleep = filtered_df["SLPHOURS_A"].mean()
-        poor_sleep_count = filtered_df["SLPFLL_A"].isin([4, 5]).sum()
+        avg_sleep = survey.lookup(estimates, "SLPHOURS_A")
+        poor_sleep = survey.lookup(estimates, "SLPFLL_A")
+        poor_sleep_count = filtered_df["SLPFLL_A"].isin(OFTEN_ALWAYS).sum()
 
-        st.metric("Avg Sleep (hrs)", f"{avg_sleep:.1f}")
-        st.metric("Often/Always Trouble Falling Asleep", f"{poor_sleep_count:,} respondents")
+        st.metric("Avg Sleep (hrs)", f"{avg_sleep['estimate']:.1f}",
+                  help=f"± {avg_sleep['se']:.2f} (standard error)")
+        st.metric("Often/Always Trouble Falling Asleep", f"{poor_sleep['estimate'] * 100:.1f}%",
+                  f"{poor_sleep_count:,} respondents",
+                  help=f"± {poor_sleep['se'] * 100:.1f} points (standard error)")
+        st.caption(ESTIMATE_NOTE)
 
 # --- Tab 2: Visualizations ---
 with tab2:
@@ -308,7 +401,8 @@ with tab2:
     # --- Correlation Matrix (Altair) excluding SLPMEDINTRO_A ---
     st.markdown("#### 🔗 Correlation Matrix")
     # Select columns for correlation, excluding 'SLPMEDINTRO_A'
-    corr_cols = [col for col in viz_df_full.select_dtypes(include='number').columns if col != 'SLPMEDINTRO_A']
+    corr_cols = [col for col in viz_df_full.select_dtypes(include='number').columns
+                 if col != 'SLPMEDINTRO_A' and col not in survey.DESIGN_COLS + ['year']]
     corr = viz_df_full[corr_cols].corr()
     corr_df = corr.reset_index().melt(id_vars='index')
     corr_df.columns = ['Variable 1', 'Variable 2', 'Correlation']
@@ -335,82 +429,49 @@ with tab2:
 
     # 1. Distribution of Sleep Hours
     st.markdown("#### ⏳ Distribution of Sleep Hours")
-    hist = alt.Chart(viz_df_full).mark_bar(opacity=0.7).encode(
-        alt.X("SLPHOURS_A:Q", bin=alt.Bin(maxbins=20), title="Sleep Hours (per 24 hrs)"),
-        alt.Y("count()", title="Number of Respondents"),
-        tooltip=["count()"]
+    charts = chart_frames(filter_key, filtered_df)
+    hist = alt.Chart(charts["hours_hist"]).mark_bar(opacity=0.7).encode(
+        alt.X("bin_start:Q", bin="binned", title="Sleep Hours (per 24 hrs)"),
+        alt.X2("bin_end:Q"),
+        alt.Y("count:Q", title="Number of Respondents"),
+        tooltip=[alt.Tooltip("bin_start:Q", title="From"), alt.Tooltip("bin_end:Q", title="To"),
+                 alt.Tooltip("count:Q", title="Respondents")]
     ).properties(width=600, height=400)
     st.altair_chart(hist, use_container_width=True)
 
     # 2. Sleep Hours vs. Age
     st.markdown("#### 👤 Sleep Hours vs. Age")
-    scatter = alt.Chart(viz_df_full).mark_circle(size=60, opacity=0.5).encode(
-        x=alt.X("AGEP_A:Q", title="Age"),
-        y=alt.Y("SLPHOURS_A:Q", title="Sleep Hours"),
-        tooltip=["AGEP_A", "SLPHOURS_A", "Education_Label", "Sex_Label"]
+    # Respondents per (age, hours) cell instead of one point per respondent
+    density = alt.Chart(charts["age_hours"]).mark_rect().encode(
+        x=alt.X("x_start:Q", bin="binned", title="Age"),
+        x2="x_end:Q",
+        y=alt.Y("y_start:Q", bin="binned", title="Sleep Hours"),
+        y2="y_end:Q",
+        color=alt.Color("count:Q", title="Respondents", scale=alt.Scale(scheme="blues")),
+        tooltip=[alt.Tooltip("x_start:Q", title="Age from"), alt.Tooltip("x_end:Q", title="Age to"),
+                 alt.Tooltip("y_start:Q", title="Hours from"), alt.Tooltip("y_end:Q", title="Hours to"),
+                 alt.Tooltip("count:Q", title="Respondents")]
     ).properties(width=600, height=400)
-    regression = scatter.transform_regression("AGEP_A", "SLPHOURS_A").mark_line(color="red")
-    st.altair_chart(scatter + regression, use_container_width=True)
+    regression = alt.Chart(charts["age_hours_fit"]).mark_line(color="red").encode(x="x:Q", y="y:Q")
+    st.altair_chart(density + regression, use_container_width=True)
+    fit = charts["age_hours_fit_stats"]
+    if not pd.isna(fit["slope"]):
+        st.caption(f"Red line: least-squares fit, {fit['slope'] * 10:+.2f} hours of sleep per 10 years of age "
+                   f"(R² = {fit['r2']:.3f}, n = {fit['n']:,}).")
 
     # 3. Sleep Aid Usage by Age Groups (NEW VISUALIZATION)
     st.markdown("#### 💊 Sleep Aid Usage by Age Groups")
 
 
-    # Create age groups
-    def create_age_groups(age):
-        if age < 30:
-            return "18-29"
-        elif age < 40:
-            return "30-39"
-        elif age < 50:
-            return "40-49"
-        elif age < 60:
-            return "50-59"
-        elif age < 70:
-            return "60-69"
-        else:
-            return "70+"
-
-
-    # Add age groups and education labels to filtered dataframe
-    viz_df = viz_df_full.copy()
-    viz_df["Age_Group"] = viz_df["AGEP_A"].apply(create_age_groups)
-
-    # Create sleep aid usage data
-    sleep_aid_cols = ['SLPMED1_A', 'SLPMED2_A', 'SLPMED3_A']
-    sleep_aid_labels = {
-        'SLPMED1_A': 'Prescription Sleep Medication',
-        'SLPMED2_A': 'OTC Sleep Aids/Supplements',
-        'SLPMED3_A': 'Marijuana/CBD Products'
-    }
-
-    # Calculate percentage of people who use each sleep aid "Often" or "Always" (4 or 5)
-    sleep_aid_data = []
-
-    for age_group in sorted(viz_df["Age_Group"].unique()):
-        age_group_data = viz_df[viz_df["Age_Group"] == age_group]
-
-        for col, label in sleep_aid_labels.items():
-            if col in viz_df.columns:
-                # Count people who use "Often" (4) or "Always" (5)
-                users = age_group_data[col].isin([4, 5]).sum()
-                total = age_group_data[col].notna().sum()
-                percentage = (users / total * 100) if total > 0 else 0
-
-                sleep_aid_data.append({
-                    'Age_Group': age_group,
-                    'Sleep_Aid_Type': label,
-                    'Usage_Percentage': percentage,
-                    'Users_Count': users,
-                    'Total_Count': total
-                })
-
-    sleep_aid_df = pd.DataFrame(sleep_aid_data)
+    # Share of adults who use each sleep aid "Often" or "Always" (4 or 5), per age
+    # group: survey-weighted like the metrics below (raw counts in the tooltip)
+    sleep_aid_df = sleep_aid_usage(filter_key, df, filter_mask.to_numpy())
 
     # Create grouped bar chart
     sleep_aid_chart = alt.Chart(sleep_aid_df).mark_bar().encode(
         x=alt.X('Age_Group:N', title='Age Group', sort=['18-29', '30-39', '40-49', '50-59', '60-69', '70+']),
-        y=alt.Y('Usage_Percentage:Q', title='Percentage Using Often/Always (%)'),
+        y=alt.Y('Usage_Percentage:Q',
+                title='Estimated % Using Often/Always' if weighted else 'Sample % Using Often/Always (unweighted)'),
         color=alt.Color('Sleep_Aid_Type:N',
                         title='Sleep Aid Type',
                         scale=alt.Scale(range=['#1f77b4', '#ff7f0e', '#2ca02c'])),
@@ -419,6 +480,7 @@ with tab2:
             'Age_Group:N',
             'Sleep_Aid_Type:N',
             alt.Tooltip('Usage_Percentage:Q', format='.1f', title='Usage %'),
+            alt.Tooltip('Usage_SE:Q', format='.1f', title='± SE (points)'),
             alt.Tooltip('Users_Count:Q', title='Number of Users'),
             alt.Tooltip('Total_Count:Q', title='Total Respondents')
         ]
@@ -429,6 +491,7 @@ with tab2:
     )
 
     st.altair_chart(sleep_aid_chart, use_container_width=True)
+    st.caption(ESTIMATE_NOTE)
 
     # Add summary statistics with explanations
     st.markdown("#### 📈 Sleep Aid Usage Metrics")
@@ -437,9 +500,10 @@ with tab2:
     st.markdown("""
     <div class="metric-explanation">
         <strong>📊 How to Read These Metrics:</strong><br>
-        These percentages show the proportion of respondents in your filtered dataset who use each type of sleep aid 
-        <strong>"Often"</strong> or <strong>"Always"</strong> (responding 4 or 5 on the 5-point scale). The numbers in smaller text 
-        show the actual count of frequent users out of the total respondents who answered each question.
+        These percentages estimate the share of adults matching your filters who use each type of sleep aid 
+        <strong>"Often"</strong> or <strong>"Always"</strong> (responding 4 or 5 on the 5-point scale), using the survey weights 
+        when the extract has them. The numbers in smaller text show the actual count of frequent users out of the total 
+        respondents who answered each question.
         <br><br>
         <strong>🔍 What This Tells Us:</strong><br>
         • <strong>Higher percentages</strong> suggest more prevalent sleep issues requiring intervention<br>
@@ -449,25 +513,16 @@ with tab2:
     </div>
     """, unsafe_allow_html=True)
 
-    col1, col2, col3 = st.columns(3)
-
-    with col1:
-        prescription_users = viz_df['SLPMED1_A'].isin([4, 5]).sum() if 'SLPMED1_A' in viz_df.columns else 0
-        prescription_total = viz_df['SLPMED1_A'].notna().sum() if 'SLPMED1_A' in viz_df.columns else 1
-        st.metric("Prescription Sleep Meds", f"{prescription_users / prescription_total * 100:.1f}%",
-                  f"{prescription_users:,} of {prescription_total:,} respondents")
-
-    with col2:
-        otc_users = viz_df['SLPMED2_A'].isin([4, 5]).sum() if 'SLPMED2_A' in viz_df.columns else 0
-        otc_total = viz_df['SLPMED2_A'].notna().sum() if 'SLPMED2_A' in viz_df.columns else 1
-        st.metric("OTC Sleep Aids", f"{otc_users / otc_total * 100:.1f}%",
-                  f"{otc_users:,} of {otc_total:,} respondents")
-
-    with col3:
-        cannabis_users = viz_df['SLPMED3_A'].isin([4, 5]).sum() if 'SLPMED3_A' in viz_df.columns else 0
-        cannabis_total = viz_df['SLPMED3_A'].notna().sum() if 'SLPMED3_A' in viz_df.columns else 1
-        st.metric("Marijuana/CBD", f"{cannabis_users / cannabis_total * 100:.1f}%",
-                  f"{cannabis_users:,} of {cannabis_total:,} respondents")
+    for column, (col, label) in zip(st.columns(3), [('SLPMED1_A', "Prescription Sleep Meds"),
+                                                    ('SLPMED2_A', "OTC Sleep Aids"),
+                                                    ('SLPMED3_A', "Marijuana/CBD")]):
+        with column:
+            users = filtered_df[col].isin(OFTEN_ALWAYS).sum() if col in filtered_df.columns else 0
+            total = filtered_df[col].notna().sum() if col in filtered_df.columns else 0
+            est = survey.lookup(estimates, col)
+            st.metric(label, f"{est['estimate'] * 100:.1f}%", f"{users:,} of {total:,} respondents",
+                      help=f"± {est['se'] * 100:.1f} points (standard error)")
+    st.caption(ESTIMATE_NOTE)
 
 # --- Tab 3: Export ---
 with tab3:
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# Binary EEG recording format shared by scripts/export_eeg_csv.py and the EEG Viewer.
+#
+# One recording = files next to each other:
+#   <stem>.npy      float32 samples, channel-major: shape (n_channels, n_times)
+#   <stem>.lod.npy  optional min/max pyramid: shape (n_channels, total_bins, 2)
+#   <stem>.json     header: channel names, sfreq, t0, n_times, pyramid levels, ...
+# The header is written last, so its presence means the other files are complete.
+#
+# The pyramid holds min/max envelopes at 8x, 16x, 32x, ... decimation, so any
+# zoom level can be drawn with a bounded number of points without scanning raw
+# samples. Levels below 8x are not stored: a 2x min/max envelope is as large as
+# the samples themselves, and windows that narrow are cheap to read raw.
+#
+# Readers memory-map the samples: slicing a few channels over a time window only
+# pages in those rows, and every process reading the same file shares the OS
+# page cache instead of holding a private copy.
+
+import os
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+FORMAT_NAME = "eeg-npy"
+FORMAT_VERSION = 1
+DATA_SUFFIX = ".npy"
+HEADER_SUFFIX = ".json"
+LOD_SUFFIX = ".lod.npy"
+TIME_COL = "Time"
+
+# Pyramid defaults: first level at LOD_FIRST_FACTOR, then halve per level until a
+# level has at most LOD_MIN_BINS bins
+LOD_FIRST_FACTOR = 8
+LOD_FACTOR = 2
+LOD_MIN_BINS = 256
+
+
+def recording_paths(stem: str) -> Tuple[str, str]:
+    """Return (samples path, header path) for a recording stem (path without extension)."""
+    return stem + DATA_SUFFIX, stem + HEADER_SUFFIX
+
+
+def lod_path(stem: str) -> str:
+    return stem + LOD_SUFFIX
+
+
+def has_recording(stem: str) -> bool:
+    return all(os.path.exists(p) for p in recording_paths(stem))
+
+
+def _atomic_write(path: str, write_fn):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write_fn(f)
+    os.replace(tmp, path)
+
+
+def _reduce_envelope(mins: np.ndarray, maxs: np.ndarray, factor: int):
+    """Combine each run of `factor` bins into one (the last run is edge-padded)."""
+    n = mins.shape[1]
+    n_bins = int(np.ceil(n / factor))
+    pad = n_bins * factor - n
+    if pad:
+        mins = np.pad(mins, ((0, 0), (0, pad)), mode="edge")
+        maxs = np.pad(maxs, ((0, 0), (0, pad)), mode="edge")
+    shape = (mins.shape[0], n_bins, factor)
+    return mins.reshape(shape).min(axis=2), maxs.reshape(shape).max(axis=2)
+
+
+def build_pyramid(data: np.ndarray, first_factor: int = LOD_FIRST_FACTOR,
+                  factor: int = LOD_FACTOR,
+                  min_bins: int = LOD_MIN_BINS) -> Tuple[np.ndarray, Dict]:
+    """Min/max envelopes at first_factor, first_factor * factor, ... decimation.
+
+    Returns (envelopes, levels): envelopes is (n_channels, total_bins, 2) with
+    [..., 0] = min and [..., 1] = max; levels describes where each level starts.
+    """
+    mins = maxs = data
+    decimation = 1
+    blocks, factors, offsets, lengths = [], [], [], []
+    offset = 0
+    while mins.shape[1] > min_bins:
+        step = first_factor if decimation == 1 else factor
+        mins, maxs = _reduce_envelope(mins, maxs, step)
+        decimation *= step
+        blocks.append(np.stack([mins, maxs], axis=2))
+        factors.append(decimation)
+        offsets.append(offset)
+        lengths.append(mins.shape[1])
+        offset += mins.shape[1]
+    levels = {"factors": factors, "offsets": offsets, "lengths": lengths}
+    if not blocks:
+        return np.empty((data.shape[0], 0, 2), dtype=np.float32), levels
+    return np.concatenate(blocks, axis=1).astype(np.float32), levels
+
+
+def write_recording(stem: str, data: np.ndarray, ch_names: List[str],
+                    sfreq: float, t0: float = 0.0, pyramid: bool = True) -> Dict:
+    """Write channel-major samples, optional min/max pyramid, then header. Returns the header."""
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    if data.ndim != 2 or data.shape[0] != len(ch_names):
+        raise ValueError(f"expected ({len(ch_names)}, n_times) samples, got {data.shape}")
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "dtype": "float32",
+        "layout": "channel-major",
+        "channels": list(ch_names),
+        "sfreq": float(sfreq),
+        "t0": float(t0),
+        "n_times": int(data.shape[1]),
+        # Lets readers skip all-NaN channels without scanning samples
+        "empty_channels": [ch for ch, row in zip(ch_names, data) if np.isnan(row).all()],
+    }
+    data_path, header_path = recording_paths(stem)
+    _atomic_write(data_path, lambda f: np.save(f, data, allow_pickle=False))
+    if pyramid:
+        envelopes, levels = build_pyramid(data)
+        if levels["factors"]:
+            _atomic_write(lod_path(stem), lambda f: np.save(f, envelopes, allow_pickle=False))
+            header["lod"] = levels
+    _atomic_write(header_path, lambda f: f.write(json.dumps(header, indent=2).encode("utf-8")))
+    return header
+
+
+def read_header(stem: str) -> Dict:
+    with open(recording_paths(stem)[1], "r", encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("format") != FORMAT_NAME:
+        raise ValueError(f"{stem}: not an {FORMAT_NAME} header")
+    return header
+
+
+def read_recording(stem: str) -> Tuple[Dict, np.ndarray]:
+    """Load header and the full (n_channels, n_times) float32 array."""
+    header = read_header(stem)
+    data = np.load(recording_paths(stem)[0], allow_pickle=False)
+    if data.shape != (len(header["channels"]), header["n_times"]):
+        raise ValueError(f"{stem}: samples shape {data.shape} does not match header")
+    return header, data
+
+
+def recording_times(header: Dict) -> np.ndarray:
+    return header["t0"] + np.arange(header["n_times"], dtype=np.float64) / header["sfreq"]
+
+
+def recording_to_frame(header: Dict, data: np.ndarray) -> pd.DataFrame:
+    """Same shape as the exported CSVs: one column per channel plus 'Time'."""
+    df = pd.DataFrame(data.T, columns=header["channels"])
+    df[TIME_COL] = recording_times(header)
+    return df
+
+
+# =============================================================================
+# Memory-mapped reader
+# =============================================================================
+class RecordingReader:
+    """Channel-major recording that reads only the requested channels and time window."""
+
+    def __init__(self, header: Dict, data: np.ndarray, lod: np.ndarray = None):
+        self.header = header
+        self.channels: List[str] = list(header["channels"])
+        self.sfreq = float(header["sfreq"])
+        self.t0 = float(header["t0"])
+        self.n_times = int(header["n_times"])
+        self._data = data
+        self._lod = lod
+        self._levels = header.get("lod") if lod is not None else None
+        self._index = {ch: i for i, ch in enumerate(self.channels)}
+        empty = set(header.get("empty_channels", []))
+        self.nonempty_channels = [ch for ch in self.channels if ch not in empty]
+
+    @classmethod
+    def open(cls, stem: str) -> "RecordingReader":
+        """Memory-map a binary recording; nothing is read until a slice is requested."""
+        header = read_header(stem)
+        data = np.load(recording_paths(stem)[0], mmap_mode="r", allow_pickle=False)
+        if data.shape != (len(header["channels"]), header["n_times"]):
+            raise ValueError(f"{stem}: samples shape {data.shape} does not match header")
+        lod = None
+        if header.get("lod") and os.path.exists(lod_path(stem)):
+            lod = np.load(lod_path(stem), mmap_mode="r", allow_pickle=False)
+        return cls(header, data, lod)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "RecordingReader":
+        """Wrap a legacy CSV frame (channels + 'Time') in the same interface."""
+        if TIME_COL not in df.columns:
+            raise ValueError(f"missing the '{TIME_COL}' column")
+        channels = [c for c in df.columns if c != TIME_COL]
+        times = df[TIME_COL].to_numpy(dtype=np.float64)
+        sfreq = 1.0 / float(np.median(np.diff(times))) if len(times) > 1 else 1.0
+        data = np.ascontiguousarray(df[channels].to_numpy(dtype=np.float32).T)
+        header = {
+            "channels": channels,
+            "sfreq": sfreq,
+            "t0": float(times[0]) if len(times) else 0.0,
+            "n_times": len(times),
+            "empty_channels": [ch for ch, row in zip(channels, data) if np.isnan(row).all()],
+        }
+        return cls(header, data)
+
+    @property
+    def duration(self) -> float:
+        return self.n_times / self.sfreq
+
+    def sample_range(self, tmin: float = None, tmax: float = None) -> Tuple[int, int]:
+        """[start, stop) sample indices covering [tmin, tmax] seconds."""
+        start = 0 if tmin is None else int(np.floor((tmin - self.t0) * self.sfreq))
+        stop = self.n_times if tmax is None else int(np.ceil((tmax - self.t0) * self.sfreq)) + 1
+        return max(start, 0), min(max(stop, 0), self.n_times)
+
+    def times(self, start: int, stop: int) -> np.ndarray:
+        return self.t0 + np.arange(start, stop, dtype=np.float64) / self.sfreq
+
+    def read(self, channels: List[str], tmin: float = None,
+             tmax: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (times, samples) with samples shaped (len(channels), n) as float32.
+
+        Unknown channel names raise KeyError. Only the selected rows and window are
+        copied out of the memory map.
+        """
+        rows = [self._index[ch] for ch in channels]
+        start, stop = self.sample_range(tmin, tmax)
+        return self.times(start, stop), np.array(self._data[rows, start:stop], dtype=np.float32)
+
+    @property
+    def has_pyramid(self) -> bool:
+        return self._levels is not None
+
+    def read_envelope(self, channels: List[str], tmin: float = None, tmax: float = None,
+                      max_points: int = 2400):
+        """Min/max envelope of [tmin, tmax] from the finest pyramid level that fits.
+
+        Returns (times, values) with min and max interleaved, so each channel has at
+        most about max_points points, or None when there is no pyramid or even the
+        finest level would underfill max_points (read() the raw window instead; it
+        is at most max_points * first factor / 2 samples).
+        """
+        start, stop = self.sample_range(tmin, tmax)
+        if self._levels is None or 2 * (stop - start) <= max_points * self._levels["factors"][0]:
+            return None
+        rows = [self._index[ch] for ch in channels]
+        levels = list(zip(self._levels["factors"], self._levels["offsets"], self._levels["lengths"]))
+        for i, (factor, offset, length) in enumerate(levels):
+            b0 = start // factor
+            b1 = min(-(-stop // factor), length)
+            # Coarsest level is used even if it overshoots the budget
+            if 2 * (b1 - b0) <= max_points or i == len(levels) - 1:
+                break
+        env = np.array(self._lod[rows, offset + b0:offset + b1, :], dtype=np.float32)
+        t_bin = self.t0 + np.arange(b0, b1, dtype=np.float64) * factor / self.sfreq
+        times = np.stack([t_bin, t_bin + 0.5 * factor / self.sfreq], axis=1).ravel()
+        return times, env.reshape(len(rows), -1)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# Remote EEG recordings on the Hugging Face Hub: file index + background prefetch.
+#
+# Listing the dataset is a network round trip, so the listing is persisted to
+# disk with a TTL. Fresh copies are served without touching the network, stale
+# copies are refreshed, and if the Hub cannot be reached the last listing (or
+# whatever is already downloaded) keeps the viewer usable offline.
+#
+# Downloads go through shared thread pools that de-duplicate in-flight
+# requests, so the viewer can start fetching a subject's other recordings while
+# the user is still looking at the first one. Foreground fetches have their own
+# pool, so they never wait behind queued prefetches; a prefetch of the same
+# file that has not started yet is cancelled and fetched in the foreground.
+# Files are stored in a bounded LRU RecordingCache (see disk_cache.py).
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from huggingface_hub import hf_hub_download, list_repo_files
+
+from disk_cache import RecordingCache
+from recordings import DATA_SUFFIX, HEADER_SUFFIX, LOD_SUFFIX
+
+INDEX_FILENAME = ".remote_index.json"
+INDEX_TTL_SEC = 3600
+
+RecordingIndex = Dict[str, Dict[Tuple[str, str], str]]
+
+
+# =============================================================================
+# Persisted listing
+# =============================================================================
+def _read_listing(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            listing = json.load(f)
+        return listing if isinstance(listing.get("files"), list) else {}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def _write_listing(path: str, listing: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(listing, f)
+    os.replace(tmp, path)
+
+
+def list_remote_files(repo_id: str, cache_dir: str, ttl_sec: float = INDEX_TTL_SEC,
+                      local_dirs: Sequence[str] = ()) -> Tuple[List[str], str]:
+    """Return (files, source) where source is 'cache', 'remote', 'stale' or 'local'.
+
+    'local' lists the recordings already on disk in `cache_dir` and `local_dirs`.
+    """
+    path = os.path.join(cache_dir, INDEX_FILENAME)
+    cached = _read_listing(path)
+    if cached.get("repo_id") == repo_id and time.time() - cached.get("fetched_at", 0) < ttl_sec:
+        return cached["files"], "cache"
+    try:
+        files = list_repo_files(repo_id=repo_id, repo_type="dataset")
+    except Exception:
+        files = None
+    if files:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_listing(path, {"repo_id": repo_id, "fetched_at": time.time(), "files": list(files)})
+        return list(files), "remote"
+    if cached.get("repo_id") == repo_id:
+        return cached["files"], "stale"
+    # Offline cold start: whatever has been downloaded or exported already
+    local = {f for d in (cache_dir, *local_dirs) if os.path.isdir(d) for f in os.listdir(d)}
+    return sorted(f for f in local if f.startswith("sub-")), "local"
+
+
+# =============================================================================
+# {subject: {(session, task): filename}}
+# =============================================================================
+def build_recording_index(files: List[str]) -> RecordingIndex:
+    """Map subject id (no 'sub-' prefix) -> (session, task) -> file to load.
+
+    Binary recordings (.npy with a .json header) win over CSV for the same slot.
+    """
+    file_set = set(files)
+    index: RecordingIndex = {}
+    for f in files:
+        is_binary = f.endswith(DATA_SUFFIX) and f[:-len(DATA_SUFFIX)] + HEADER_SUFFIX in file_set
+        if not (is_binary or f.endswith(".csv")):
+            continue
+        parts = os.path.splitext(f)[0].split("_")
+        if len(parts) != 3 or not parts[0].startswith("sub-"):
+            continue
+        subj, session, task = parts
+        slots = index.setdefault(subj.replace("sub-", ""), {})
+        if is_binary or (session, task) not in slots:
+            slots[(session, task)] = f
+    return index
+
+
+def recording_files(filename: str, available: Iterable[str]) -> List[str]:
+    """All files that make up one recording: samples first, then header and pyramid."""
+    if not filename.endswith(DATA_SUFFIX):
+        return [filename]
+    stem = filename[:-len(DATA_SUFFIX)]
+    files = [filename, stem + HEADER_SUFFIX]
+    if stem + LOD_SUFFIX in available:
+        files.append(stem + LOD_SUFFIX)
+    return files
+
+
+# =============================================================================
+# Background prefetch
+# =============================================================================
+class Prefetcher:
+    """Thread-pool downloader shared by all sessions; one in-flight fetch per file."""
+
+    def __init__(self, repo_id: str, cache: RecordingCache, max_workers: int = 4,
+                 prefetch_workers: int = 2):
+        self.repo_id = repo_id
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="eeg-fetch")
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=prefetch_workers,
+                                                 thread_name_prefix="eeg-prefetch")
+        self._inflight: Dict[str, Future] = {}
+        self._prefetching = set()  # files whose in-flight future is a prefetch
+        # Reentrant: cancelling a queued prefetch runs its _forget callback at once
+        self._lock = threading.RLock()
+
+    def _download(self, filename: str) -> str:
+        return self.cache.put(filename, lambda staging: hf_hub_download(
+            repo_id=self.repo_id, filename=filename, repo_type="dataset",
+            local_dir=staging, local_dir_use_symlinks=False
+        ))
+
+    def _forget(self, filename: str, fut: Future):
+        with self._lock:
+            if self._inflight.get(filename) is fut:
+                del self._inflight[filename]
+                self._prefetching.discard(filename)
+
+    def _submit(self, filename: str, pool: ThreadPoolExecutor) -> Future:
+        # Caller holds self._lock and must _track() the future after releasing it
+        fut = pool.submit(self._download, filename)
+        self._inflight[filename] = fut
+        return fut
+
+    def _track(self, filename: str, fut: Future):
+        # Never under self._lock: an already finished future (e.g. a download
+        # that failed at once) runs the callback right here, and _forget locks
+        fut.add_done_callback(lambda f: self._forget(filename, f))
+
+    def fetch_async(self, filename: str) -> Future:
+        """Future resolving to the local path; joins an existing download if one is running."""
+        with self._lock:
+            fut = self._inflight.get(filename)
+            # Join a running download; a prefetch still in the queue is taken over
+            if fut is not None and not (filename in self._prefetching and fut.cancel()):
+                return fut
+            path = self.cache.get(filename)
+            if path is not None:
+                fut = Future()
+                fut.set_result(path)
+                return fut
+            fut = self._submit(filename, self._pool)
+        self._track(filename, fut)
+        return fut
+
+    def fetch(self, filename: str, timeout: float = None) -> str:
+        """Blocking fetch; raises whatever the download raised."""
+        return self.fetch_async(filename).result(timeout=timeout)
+
+    def prefetch(self, filenames: Iterable[str]):
+        """Queue downloads without waiting; a failed prefetch is retried by the next fetch().
+
+        Already-cached files are only peeked at (no hit counted, LRU order untouched).
+        """
+        with self._lock:
+            submitted = [(f, self._submit(f, self._prefetch_pool)) for f in filenames
+                         if f not in self._inflight and not self.cache.contains(f)]
+            self._prefetching.update(f for f, _ in submitted)
+        for f, fut in submitted:
+            self._track(f, fut)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._inflight)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Bootstrap confidence intervals for Compare View's group-level correlation.
+#
+# Compare View cannot pair EEG and NHIS rows, so it sorts each dataset's group
+# (or quantile-bin) means ascending, truncates both to the shorter length and
+# correlates the two sorted series. A resample has to rebuild that statistic
+# the same way: resample the rows inside every group of each dataset
+# independently, recompute the group means, sort each series, truncate and
+# correlate. Resampling or permuting the (x, y) pairs of the sorted series
+# would not: both are always in ascending order, so such resamples keep
+# Spearman r at 1 and say nothing about the data. All resamples are drawn from
+# a seeded generator and correlated as one batched array operation.
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.stats import rankdata
+
+N_RESAMPLES = 2000
+SEED = 0
+CI_LEVEL = 0.95
+# Row-level draws are generated in chunks of at most this many values
+CHUNK_VALUES = 2_000_000
+
+
+# =============================================================================
+# Batched correlation
+# =============================================================================
+def corr_batch(x: np.ndarray, y: np.ndarray, method: str = "spearman") -> np.ndarray:
+    """Pearson or Spearman r along the last axis: (..., n) x (..., n) -> (...)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if method == "spearman":
+        x, y = rankdata(x, axis=-1), rankdata(y, axis=-1)
+    xc = x - x.mean(axis=-1, keepdims=True)
+    yc = y - y.mean(axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = (xc * yc).sum(axis=-1) / np.sqrt((xc ** 2).sum(axis=-1) * (yc ** 2).sum(axis=-1))
+    return np.clip(r, -1.0, 1.0)
+
+
+def _interval(r: np.ndarray, level: float):
+    r = r[np.isfinite(r)]
+    if r.size == 0:
+        return np.nan, np.nan
+    alpha = (1 - level) / 2
+    lo, hi = np.quantile(r, [alpha, 1 - alpha])
+    return float(lo), float(hi)
+
+
+# =============================================================================
+# Row-level resampling
+# =============================================================================
+def resampled_means(cells: List[np.ndarray], n_resamples: int, rng: np.random.Generator) -> np.ndarray:
+    """(n_resamples, n_cells) bootstrap means, resampling rows within each cell."""
+    out = np.full((n_resamples, len(cells)), np.nan)
+    for j, vals in enumerate(cells):
+        vals = np.asarray(vals, dtype=float)
+        if vals.size == 0:
+            continue
+        step = max(1, CHUNK_VALUES // vals.size)
+        for start in range(0, n_resamples, step):
+            stop = min(start + step, n_resamples)
+            idx = rng.integers(0, vals.size, size=(stop - start, vals.size))
+            out[start:stop, j] = vals[idx].mean(axis=1)
+    return out
+
+
+def sorted_means_ci(cells_x: List[np.ndarray], cells_y: List[np.ndarray], n: int,
+                    method: str = "spearman", n_resamples: int = N_RESAMPLES, seed: int = SEED,
+                    level: float = CI_LEVEL):
+    """CI for r between the first `n` ascending cell means of x and of y, resampling rows."""
+    rng = np.random.default_rng(seed)
+    mx = np.sort(resampled_means(cells_x, n_resamples, rng), axis=1)[:, :n]
+    my = np.sort(resampled_means(cells_y, n_resamples, rng), axis=1)[:, :n]
+    return _interval(corr_batch(mx, my, method), level)
+
+
+def correlation_uncertainty(x: Sequence[float], y: Sequence[float], method: str = "spearman",
+                            cells_x: Optional[List[np.ndarray]] = None,
+                            cells_y: Optional[List[np.ndarray]] = None,
+                            n_resamples: int = N_RESAMPLES, seed: int = SEED,
+                            level: float = CI_LEVEL) -> Dict[str, float]:
+    """r of the sorted series `x`, `y` and (given every cell's rows) its bootstrap CI.
+
+    `cells_x`/`cells_y` hold the rows behind all points of each full series,
+    not just the first len(x) that were correlated.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    ok = np.isfinite(x) & np.isfinite(y)
+    out = {"n": int(ok.sum()), "r": np.nan, "ci_low": np.nan, "ci_high": np.nan,
+           "n_resamples": n_resamples, "level": level}
+    if out["n"] < 3:
+        return out
+    out["r"] = float(corr_batch(x[ok], y[ok], method))
+    if cells_x is not None and cells_y is not None:
+        out["ci_low"], out["ci_high"] = sorted_means_ci(cells_x, cells_y, len(x), method,
+                                                        n_resamples, seed, level)
+    return out
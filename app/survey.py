@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# Survey-weighted estimates for the NHIS extract.
+#
+# NHIS is a stratified cluster sample: each adult carries a final weight
+# (WTFA_A) and belongs to a pseudo-PSU (PPSU) within a pseudo-stratum (PSTRAT).
+# estimate() returns weighted means (proportions are means of 0/1 indicators)
+# with Taylor-linearized standard errors, the usual with-replacement PSU
+# approximation. Filters are handled as domains: rows outside the filter stay
+# in the design with zero contribution, so the PSU counts per stratum, and
+# therefore the SEs, are those of the full sample. All groups and variables
+# are computed in one pass of bincounts over (PSU, group, variable).
+#
+# Without design columns (e.g. the older flat CSV) every row gets weight 1 and
+# is its own PSU, which reduces to the ordinary sample mean and its SE.
+
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+WEIGHT = "WTFA_A"
+STRATUM = "PSTRAT"
+PSU = "PPSU"
+DESIGN_COLS = [WEIGHT, STRATUM, PSU]
+# Pseudo-strata are defined per survey year, so pooled years stratify on both
+STRATA = ["year", STRATUM]
+
+ALL = "All"  # group label when nothing is grouped
+
+
+def has_design(df: pd.DataFrame) -> bool:
+    return all(c in df.columns for c in DESIGN_COLS)
+
+
+def indicator(values: pd.Series, codes: Iterable) -> np.ndarray:
+    """1.0 where `values` is in `codes`, 0.0 elsewhere, NaN where missing."""
+    x = values.isin(list(codes)).to_numpy(dtype=float)
+    x[values.isna().to_numpy()] = np.nan
+    return x
+
+
+def _design(df: pd.DataFrame):
+    """(weights, PSU id per row, stratum id per PSU) for df's rows."""
+    n = len(df)
+    w = df[WEIGHT].to_numpy(dtype=float) if WEIGHT in df.columns else np.ones(n)
+    w = np.where(np.isfinite(w), w, 0.0)
+    strata = [c for c in STRATA if c in df.columns]
+    if PSU not in df.columns:
+        return w, np.arange(n), np.zeros(n, dtype=np.int64)
+    psu = df.groupby(strata + [PSU], sort=False, dropna=False).ngroup().to_numpy()
+    h = (df.groupby(strata, sort=False, dropna=False).ngroup().to_numpy()
+         if strata else np.zeros(n, dtype=np.int64))
+    h_of_psu = np.zeros(psu.max() + 1 if n else 0, dtype=np.int64)
+    h_of_psu[psu] = h
+    return w, psu, h_of_psu
+
+
+def estimate(df: pd.DataFrame, values: Dict[str, np.ndarray], domain: Optional[np.ndarray] = None,
+             by: Optional[pd.Series] = None) -> pd.DataFrame:
+    """Weighted mean and design-based SE of each `values` column, per group of `by`.
+
+    `values`: name -> per-row numbers (NaN = not answered, left out of that
+    variable's estimate). `domain`: boolean row mask for the current filter.
+    Returns one row per (group, variable): estimate, se, n (unweighted
+    respondents) and weight (sum of weights, i.e. estimated population).
+    """
+    n, names = len(df), list(values)
+    k = len(names)
+    w, psu, h_of_psu = _design(df)
+    in_domain = np.ones(n, dtype=bool) if domain is None else np.asarray(domain, dtype=bool)
+    if by is None:
+        g, labels = np.where(in_domain, 0, -1), [ALL]
+    else:
+        codes, uniques = pd.factorize(by, sort=True)
+        g, labels = np.where(in_domain & (codes >= 0), codes, -1), list(uniques)
+    n_groups = len(labels)
+
+    y = np.column_stack([np.asarray(values[c], dtype=float) for c in names]) if k else np.empty((n, 0))
+    valid = (g >= 0)[:, None] & np.isfinite(y)
+    rows, cols = np.nonzero(valid)
+    cell = g[rows] * k + cols                      # (group, variable) of each used value
+    wv, yv = w[rows], y[rows, cols]
+
+    n_cells = n_groups * k
+    count = np.bincount(cell, minlength=n_cells)
+    w_sum = np.bincount(cell, weights=wv, minlength=n_cells)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(cell, weights=wv * yv, minlength=n_cells) / w_sum
+        # Linearized contribution of each value to its cell's ratio mean
+        z = wv * (yv - mean[cell]) / w_sum[cell]
+
+    n_psu = len(h_of_psu)
+    totals = np.bincount(psu[rows] * n_cells + cell, weights=z,
+                         minlength=n_psu * n_cells).reshape(n_psu, n_cells)
+    psu_per_stratum = np.bincount(h_of_psu)
+    stratum_mean = np.zeros((len(psu_per_stratum), n_cells))
+    np.add.at(stratum_mean, h_of_psu, totals)
+    stratum_mean /= np.maximum(psu_per_stratum, 1)[:, None]
+    # n_h / (n_h - 1); strata with a single PSU contribute no variance
+    factor = np.where(psu_per_stratum > 1, psu_per_stratum / np.maximum(psu_per_stratum - 1, 1), 0.0)
+    var = (factor[h_of_psu][:, None] * (totals - stratum_mean[h_of_psu]) ** 2).sum(axis=0)
+
+    group_name = by.name if by is not None and by.name is not None else "group"
+    return pd.DataFrame({
+        group_name: np.repeat(labels, k),
+        "variable": np.tile(names, n_groups),
+        "estimate": mean,
+        "se": np.where(count > 1, np.sqrt(var), np.nan),
+        "n": count,
+        "weight": w_sum,
+    })
+
+
+def lookup(table: pd.DataFrame, variable: str, group=ALL, group_col: Optional[str] = None) -> pd.Series:
+    """The estimate row for one (group, variable) of an estimate() table."""
+    group_col = group_col or table.columns[0]
+    row = table[(table[group_col] == group) & (table["variable"] == variable)]
+    return row.iloc[0] if len(row) else pd.Series({"estimate": np.nan, "se": np.nan, "n": 0, "weight": 0.0})
+
@@ -0,0 +1,67 @@
+"""
+build_compare_cube.py
+
+Precompute every Compare View summary into data/clean/compare_summary_cube.parquet.
+
+For each dataset (EEG summary, NHIS extract) and each numeric metric, the
+ungrouped summary and one summary per grouping the page offers are computed
+with app/group_stats.py: group mean/std/median/n/quartiles, describe(), bin
+counts and quantile-bin means. Compare View then serves dropdown changes from
+this file. NHIS data is the latest survey year of the partitioned dataset
+(app/nhis_store.py), or nhis_sleep_demo_clean.csv if none was built, which is
+what the page shows by default. Re-run after either input changes; until then
+the page notices the mismatch and computes summaries live.
+
+Usage:
+    python scripts/build_compare_cube.py
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+import nhis_store  # noqa: E402
+from compare_cube import CUBE_PATH, build_cube, file_digest, write_cube  # noqa: E402
+from eeg_summary import SUMMARY_CSV, load_eeg_summary  # noqa: E402
+from survey import DESIGN_COLS  # noqa: E402
+
+NHIS_PATH = "data/clean/nhis_sleep_demo_clean.csv"
+
+
+def load_nhis():
+    """(frame, source file) for the latest NHIS year, as Compare View loads it by default."""
+    years = nhis_store.available_years()
+    if years:
+        df, source = nhis_store.read(years[-1:]), nhis_store.partition_file(years[-1])
+    else:
+        df, source = pd.read_csv(NHIS_PATH), NHIS_PATH
+    # Survey responses only: the design columns and the CSV's year tag are not compared (data.nhis_summary)
+    return df.drop(columns=[c for c in DESIGN_COLS + [nhis_store.YEAR_COL] if c in df.columns]), source
+
+
+def main():
+    missing = [p for p in (SUMMARY_CSV, NHIS_PATH) if not os.path.exists(p)
+               and not (p == NHIS_PATH and nhis_store.available_years())]
+    if missing:
+        for p in missing:
+            print(f"❌ Not found: {p}")
+        return
+
+    t0 = time.perf_counter()
+    # Same typed EEG frame the pages use, so group candidates and values match
+    nhis_df, nhis_source = load_nhis()
+    frames = {"eeg": load_eeg_summary(SUMMARY_CSV), "nhis": nhis_df}
+    print(f"🧮 Summarizing EEG ({len(frames['eeg'])} rows) and NHIS ({len(frames['nhis'])} rows)...")
+    cube = build_cube(frames)
+    write_cube(cube, {"eeg": file_digest(SUMMARY_CSV), "nhis": file_digest(nhis_source)})
+
+    n_summaries = len(cube[["dataset", "metric", "group_by"]].drop_duplicates())
+    print(f"✅ Compare cube saved to: {CUBE_PATH} "
+          f"({n_summaries} summaries, {len(cube)} rows, {time.perf_counter() - t0:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
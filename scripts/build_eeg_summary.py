@@ -0,0 +1,287 @@
+"""
+build_eeg_summary.py
+
+Rebuild data/clean/eeg_summary.csv from the raw OpenNeuro .set files.
+
+Scripted, multi-core version of the band-power loop in
+notebooks/openneuro_cleaning.ipynb. Recordings are read and filtered (1–40 Hz)
+across a process pool in chunks; each chunk's Welch PSDs are computed in one
+vectorized pass (app/band_power.py) and all band powers are derived from the
+stacked PSDs at the end. Output columns and values match the notebook.
+
+Also writes data/clean/eeg_band_cube.parquet: band power per channel and per
+region for every recording (app/band_cube.py).
+
+Runs are incremental: data/clean/eeg_features_manifest.json keeps each raw
+file's size + mtime and the pipeline parameters it was processed with, and only
+new or changed recordings are recomputed. Their rows replace the old ones in
+the existing summary and cube; recordings whose raw files are gone are dropped.
+Recordings whose band power failed are not recorded, so they are retried next
+run. The manifest also fingerprints participants.tsv: editing it re-merges the
+demographics into the summary without recomputing any band power.
+
+Usage:
+    python scripts/build_eeg_summary.py
+    python scripts/build_eeg_summary.py --workers 4 --chunk-size 8
+    python scripts/build_eeg_summary.py --force   # full rebuild
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import mne
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from band_power import BANDS, FFT_SECONDS, band_power_by_channel, to_db, welch_psd_batch  # noqa: E402
+from band_cube import CUBE_PATH, build_cube, concat_cubes, write_cube  # noqa: E402
+from manifest import file_fingerprint, is_up_to_date, load_manifest, save_manifest, source_fingerprint  # noqa: E402
+
+RAW_DIR = "data/raw/eeg"
+CLEAN_DIR = "data/clean"
+SUMMARY_PATH = os.path.join(CLEAN_DIR, "eeg_summary.csv")
+PARTICIPANTS_PATH = os.path.join(RAW_DIR, "participants.tsv")
+MANIFEST_PATH = os.path.join(CLEAN_DIR, "eeg_features_manifest.json")
+
+L_FREQ = 1.0
+H_FREQ = 40.0
+
+# Anything that changes the numbers; a mismatch recomputes every recording
+FEATURE_PARAMS = {
+    "l_freq": L_FREQ,
+    "h_freq": H_FREQ,
+    "fft_seconds": FFT_SECONDS,
+    "bands": {k: list(v) for k, v in BANDS.items()},
+}
+
+KEYS = ["participant_id", "session", "task"]
+TECH_COLS = ["n_channels", "duration_sec", "sampling_rate"]
+
+
+# -----------------------------
+# Discovery
+# -----------------------------
+def find_set_files(raw_dir: str) -> list:
+    paths = []
+    for root, dirs, files in os.walk(raw_dir):
+        for f in files:
+            if f.endswith("_eeg.set"):
+                paths.append(os.path.join(root, f))
+    return sorted(paths)
+
+
+def parse_keys(set_path: str) -> dict:
+    f = os.path.basename(set_path)
+    return {
+        "participant_id": f.split("_")[0],
+        "session": f.split("_")[1],
+        "task": f.split("task-")[1].split("_")[0],
+    }
+
+
+# -----------------------------
+# Previous run
+# -----------------------------
+def load_previous():
+    """(summary, cube) from the last run, or (None, None) if either is missing."""
+    try:
+        return pd.read_csv(SUMMARY_PATH), pd.read_parquet(CUBE_PATH)
+    except Exception:
+        return None, None
+
+
+def rows_for(df: pd.DataFrame, keys: set) -> pd.DataFrame:
+    """Rows of `df` whose (participant_id, session, task) is in `keys`."""
+    idx = pd.MultiIndex.from_frame(df[KEYS].astype(str))
+    return df[idx.isin(list(keys))]
+
+
+# -----------------------------
+# Worker: read + filter a chunk, then one batched Welch pass
+# -----------------------------
+def process_chunk(set_paths: list) -> dict:
+    """Technical rows for every readable file, plus PSDs for those that filtered.
+
+    Like the notebook, a file whose band power fails still gets a technical row
+    (its bands end up NaN). Returns {"rows", "band_keys", "ch_names", "psds",
+    "freqs", "errors"}.
+    """
+    rows, band_keys, ch_names, arrays, sfreqs, errors = [], [], [], [], [], []
+    for set_path in set_paths:
+        try:
+            raw = mne.io.read_raw_eeglab(set_path, preload=True, verbose=False)
+        except Exception as e:
+            errors.append((os.path.basename(set_path), str(e)))
+            continue
+        info = raw.info
+        keys = parse_keys(set_path)
+        rows.append({
+            **keys,
+            "n_channels": info["nchan"],
+            "duration_sec": raw.n_times / info["sfreq"],
+            "sampling_rate": info["sfreq"],
+        })
+        try:
+            raw.filter(l_freq=L_FREQ, h_freq=H_FREQ, verbose=False)
+            arrays.append(raw.get_data())
+            sfreqs.append(info["sfreq"])
+            ch_names.append(list(raw.ch_names))
+            band_keys.append(keys)
+        except Exception as e:
+            errors.append((os.path.basename(set_path), str(e)))
+    try:
+        psds, freqs = welch_psd_batch(arrays, sfreqs, fmin=L_FREQ, fmax=H_FREQ)
+    except Exception as e:
+        errors.extend((f"{k['participant_id']}_{k['session']}_{k['task']}", str(e)) for k in band_keys)
+        band_keys, ch_names, psds, freqs = [], [], [], []
+    return {"rows": rows, "band_keys": band_keys, "ch_names": ch_names,
+            "psds": psds, "freqs": freqs, "errors": errors}
+
+
+# -----------------------------
+# Summary assembly
+# -----------------------------
+def channel_band_power(psds: list, freqs: list) -> list:
+    """(n_channels, n_bands) dB power per recording; same-shape PSDs in one pass."""
+    out = [None] * len(psds)
+    groups = {}
+    for i, (p, f) in enumerate(zip(psds, freqs)):
+        groups.setdefault((p.shape, f.tobytes()), []).append(i)
+    for idx in groups.values():
+        stacked = band_power_by_channel(to_db(np.stack([psds[i] for i in idx])), freqs[idx[0]])
+        for j, i in enumerate(idx):
+            out[i] = stacked[j]
+    return out
+
+
+def band_table(band_keys: list, channel_power: list) -> pd.DataFrame:
+    """Summary band means (over channels and in-band bins) for every recording."""
+    out = pd.DataFrame(band_keys, columns=KEYS)
+    values = np.array([p.mean(axis=0) for p in channel_power]).reshape(-1, len(BANDS))
+    for j, band in enumerate(BANDS):
+        out[f"{band}_mean"] = values[:, j]
+    return out
+
+
+def assemble_summary(tech_df: pd.DataFrame, bands_df: pd.DataFrame,
+                     participants_path: str = PARTICIPANTS_PATH) -> pd.DataFrame:
+    """Technical table + bands + condition + participants.tsv, as in the notebook."""
+    merged = pd.merge(tech_df, bands_df, on=KEYS, how="left")
+    merged["condition"] = merged["session"].map({"ses-1": "NS", "ses-2": "SD"})
+    participants = pd.read_csv(participants_path, sep="\t")
+    participants["participant_id"] = participants["participant_id"].str.strip()
+    merged = merged.merge(participants, on="participant_id", how="left")
+    return merged.sort_values(KEYS).reset_index(drop=True)
+
+
+# -----------------------------
+# Main
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild eeg_summary.csv from raw EEG.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (1 = run serially).")
+    parser.add_argument("--chunk-size", type=int, default=4,
+                        help="Recordings per worker task (one batched PSD pass each).")
+    parser.add_argument("--force", action="store_true",
+                        help="Recompute every recording, ignoring the manifest.")
+    args = parser.parse_args()
+
+    all_paths = find_set_files(RAW_DIR)
+    fingerprints = {p: source_fingerprint(p) for p in all_paths}
+    participants_fp = file_fingerprint([PARTICIPANTS_PATH])
+    prev_summary, prev_cube = (None, None) if args.force else load_previous()
+    manifest = load_manifest(MANIFEST_PATH) if prev_summary is not None else {}
+    recordings = manifest.get("recordings", {})
+    prev_keys = set() if prev_summary is None else set(
+        map(tuple, prev_summary[KEYS].astype(str).itertuples(index=False)))
+
+    reused, set_paths = set(), []
+    for p in all_paths:
+        key = tuple(parse_keys(p).values())
+        if key in prev_keys and is_up_to_date(recordings.get(os.path.basename(p)), fingerprints[p],
+                                                 FEATURE_PARAMS):
+            reused.add(key)
+        else:
+            set_paths.append(p)
+
+    chunks = [set_paths[i:i + args.chunk_size] for i in range(0, len(set_paths), args.chunk_size)]
+    if reused:
+        print(f"⏭️  Up to date (from manifest): {len(reused)}")
+    print(f"🧮 Computing band power for {len(set_paths)} recordings "
+          f"({len(chunks)} chunks, {max(1, args.workers)} worker(s))...")
+    print("------------------------------------------------------------")
+
+    rows, band_keys, ch_names, psds, freqs, errors = [], [], [], [], [], []
+    t0 = time.perf_counter()
+
+    def _collect(result: dict):
+        rows.extend(result["rows"])
+        band_keys.extend(result["band_keys"])
+        ch_names.extend(result["ch_names"])
+        psds.extend(result["psds"])
+        freqs.extend(result["freqs"])
+        errors.extend(result["errors"])
+        print(f"✅ Chunk done: {len(result['rows'])} recordings read ({len(rows)} total)")
+
+    if args.workers <= 1:
+        for chunk in chunks:
+            _collect(process_chunk(chunk))
+    elif chunks:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for fut in as_completed([pool.submit(process_chunk, c) for c in chunks]):
+                _collect(fut.result())
+
+    for fname, err in errors:
+        print(f"❌ Could not process {fname}: {err}")
+    if not rows and not reused:
+        print("❌ No recordings processed; summary not written.")
+        return
+    if not set_paths and len(reused) == len(prev_keys) and manifest.get("participants") == participants_fp:
+        print("✅ Nothing changed; summary and cube left as they are.")
+        return
+
+    # Reused recordings keep their previous technical row, band means and cube rows
+    channel_power = channel_band_power(psds, freqs)
+    band_cols = [f"{b}_mean" for b in BANDS]
+    tech_parts = [pd.DataFrame(rows, columns=KEYS + TECH_COLS)]
+    band_parts = [band_table(band_keys, channel_power)]
+    cube_parts = [build_cube(band_keys, ch_names, channel_power)]
+    if reused:
+        prev_rows = rows_for(prev_summary, reused)
+        tech_parts.insert(0, prev_rows[KEYS + TECH_COLS])
+        band_parts.insert(0, prev_rows[KEYS + band_cols])
+        cube_parts.insert(0, rows_for(prev_cube, reused))
+    tech_df = pd.concat([p for p in tech_parts if len(p)], ignore_index=True)
+    bands_df = pd.concat([p for p in band_parts if len(p)] or band_parts, ignore_index=True)
+    summary = assemble_summary(tech_df, bands_df)
+    cube = concat_cubes(cube_parts)
+    os.makedirs(CLEAN_DIR, exist_ok=True)
+    summary.to_csv(SUMMARY_PATH, index=False)
+    write_cube(cube, CUBE_PATH)
+
+    # Only recordings with band values are recorded as done; unreadable files
+    # and failed filter/PSD steps (NaN bands) are retried next run
+    with_bands = bands_df[bands_df[band_cols].notna().all(axis=1)]
+    done = set(map(tuple, with_bands[KEYS].astype(str).itertuples(index=False)))
+    save_manifest({
+        "participants": participants_fp,
+        "recordings": {
+            os.path.basename(p): {**fingerprints[p], "params": FEATURE_PARAMS}
+            for p in all_paths if tuple(parse_keys(p).values()) in done
+        },
+    }, MANIFEST_PATH)
+
+    elapsed = time.perf_counter() - t0
+    print("------------------------------------------------------------")
+    print(f"✅ EEG summary with band power saved to: {SUMMARY_PATH} "
+          f"({len(summary)} rows: {len(rows)} recomputed, {len(reused)} reused, {elapsed:.1f} s)")
+    print(f"✅ Channel/region band-power cube saved to: {CUBE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
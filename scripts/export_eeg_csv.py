@@ -1,55 +1,225 @@
+"""
+export_eeg_csv.py
+
+Export OpenNeuro EEG recordings (.set) to per-recording files for the EEG Viewer.
+
+Each recording can be written as CSV, as the binary format in app/recordings.py
+(float32 .npy + min/max pyramid + JSON header, which the viewer prefers), or both.
+The binary format keeps the full recording; the CSV is cropped to the first
+CSV_TMAX seconds to stay small. The full recording is always filtered first and
+the CSV window cut afterwards, so the CSV is the same whichever formats are
+exported together.
+
+Recordings are exported in parallel across a process pool. A manifest next to
+the exports records each output's source size, mtime and export parameters, so
+re-runs skip recordings that are already up to date and a crashed run picks up
+where it stopped.
+
+Usage:
+    python scripts/export_eeg_csv.py                # all cores
+    python scripts/export_eeg_csv.py --workers 4
+    python scripts/export_eeg_csv.py --force        # ignore the manifest
+    python scripts/export_eeg_csv.py --format npy   # binary only
+"""
+
 import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import mne
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from manifest import is_up_to_date, load_manifest, save_manifest, source_fingerprint  # noqa: E402
+from recordings import (  # noqa: E402
+    write_recording, recording_paths, LOD_FIRST_FACTOR, LOD_FACTOR, LOD_MIN_BINS,
+)
+
 RAW_DIR = "data/raw/eeg"
 EXPORT_DIR = "data/eeg_csv"
-os.makedirs(EXPORT_DIR, exist_ok=True)
+MANIFEST_PATH = os.path.join(EXPORT_DIR, "manifest.json")
 
 # Sessions and tasks to scan
 sessions = ["ses-1", "ses-2"]
 tasks = ["eyesopen", "eyesclosed"]
 
-print("📤 Exporting EEG recordings to CSV (10 seconds, filtered 1–40 Hz)...")
-print("------------------------------------------------------------")
-
-n_exported = 0
-n_skipped = 0
-
-for subj in sorted(os.listdir(RAW_DIR)):
-    if not subj.startswith("sub-"):
-        continue
-
-    subj_path = os.path.join(RAW_DIR, subj)
-    for ses in sessions:
-        for task in tasks:
-            set_fname = f"{subj}_{ses}_task-{task}_eeg.set"
-            set_path = os.path.join(subj_path, ses, "eeg", set_fname)
-
-            if not os.path.exists(set_path):
-                print(f"❌ Skipped (not found): {set_fname}")
-                n_skipped += 1
-                continue
-
-            try:
-                raw = mne.io.read_raw_eeglab(set_path, preload=True, verbose=False)
-                raw.pick_types(eeg=True)
-                raw.crop(tmax=10)
-                raw.filter(1.0, 40.0, verbose=False)
-
-                data, times = raw.get_data(return_times=True)
-                df = pd.DataFrame(data.T, columns=raw.ch_names)
-                df["Time"] = times
-
-                out_fname = f"{subj}_{ses}_{task}.csv"
-                out_path = os.path.join(EXPORT_DIR, out_fname)
-                df.to_csv(out_path, index=False)
-                print(f"✅ Exported: {out_fname}")
-                n_exported += 1
-
-            except Exception as e:
-                print(f"❌ Failed: {set_fname} ({e})")
-                n_skipped += 1
-
-print("------------------------------------------------------------")
-print(f"✅ Done. Exported: {n_exported} CSVs. Skipped: {n_skipped}.")
+# Output formats: "csv" (legacy, text) and "npy" (binary, see app/recordings.py)
+FORMATS = ("csv", "npy")
+
+# Anything that changes the exported samples belongs here: a change invalidates
+# every manifest entry and forces a re-export.
+EXPORT_PARAMS = {
+    "csv_tmax": 10.0,
+    "l_freq": 1.0,
+    "h_freq": 40.0,
+    # CSV = first csv_tmax s of the filtered full recording (not a filtered crop)
+    "csv_window": "filter_then_crop",
+    "lod_first_factor": LOD_FIRST_FACTOR,
+    "lod_factor": LOD_FACTOR,
+    "lod_min_bins": LOD_MIN_BINS,
+}
+
+
+# -----------------------------
+# Discovery
+# -----------------------------
+def find_recordings(raw_dir: str):
+    """Return (jobs, missing): one job per .set on disk, plus missing file names."""
+    jobs, missing = [], []
+    for subj in sorted(os.listdir(raw_dir)):
+        if not subj.startswith("sub-"):
+            continue
+        subj_path = os.path.join(raw_dir, subj)
+        for ses in sessions:
+            for task in tasks:
+                set_fname = f"{subj}_{ses}_task-{task}_eeg.set"
+                set_path = os.path.join(subj_path, ses, "eeg", set_fname)
+                if not os.path.exists(set_path):
+                    missing.append(set_fname)
+                    continue
+                jobs.append({
+                    "set_path": set_path,
+                    "stem": f"{subj}_{ses}_{task}",
+                })
+    return jobs, missing
+
+
+# -----------------------------
+# Manifest (see app/manifest.py)
+# -----------------------------
+def output_paths(stem: str, formats) -> list:
+    out_stem = os.path.join(EXPORT_DIR, stem)
+    paths = []
+    if "csv" in formats:
+        paths.append(out_stem + ".csv")
+    if "npy" in formats:
+        paths.extend(recording_paths(out_stem))
+    return paths
+
+
+def is_current(entry: dict, job: dict, formats) -> bool:
+    """Every requested format was exported from this source with the current params."""
+    return (
+        entry is not None
+        and set(formats) <= set(entry.get("formats", []))
+        and is_up_to_date(entry, job, EXPORT_PARAMS, output_paths(job["stem"], formats))
+    )
+
+
+# -----------------------------
+# Export (runs in worker processes)
+# -----------------------------
+def export_recording(job: dict) -> dict:
+    """Read, filter and write one recording. Never raises; failures are reported."""
+    set_path = job["set_path"]
+    out_stem = os.path.join(EXPORT_DIR, job["stem"])
+    try:
+        raw = mne.io.read_raw_eeglab(set_path, preload=True, verbose=False)
+        raw.pick_types(eeg=True)
+        # Filter before cropping in every mode: band-pass edge effects would
+        # otherwise make the CSV depend on --format
+        raw.filter(EXPORT_PARAMS["l_freq"], EXPORT_PARAMS["h_freq"], verbose=False)
+
+        data, times = raw.get_data(return_times=True)
+
+        if "npy" in job["formats"]:
+            write_recording(out_stem, data, raw.ch_names, raw.info["sfreq"], t0=float(times[0]))
+        if "csv" in job["formats"]:
+            keep = times <= times[0] + EXPORT_PARAMS["csv_tmax"]
+            df = pd.DataFrame(data[:, keep].T, columns=raw.ch_names)
+            df["Time"] = times[keep]
+            # Write-then-rename: a crash mid-write never leaves a half CSV behind
+            tmp_path = out_stem + ".csv.tmp"
+            df.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, out_stem + ".csv")
+        return {**job, "ok": True, "error": None}
+    except Exception as e:
+        return {**job, "ok": False, "error": str(e)}
+
+
+# -----------------------------
+# Main
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Export EEG recordings for the viewer.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (1 = run serially).")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-export everything, ignoring the manifest.")
+    parser.add_argument("--format", choices=["csv", "npy", "both"], default="both",
+                        help="Output format(s). The viewer prefers npy when present.")
+    args = parser.parse_args()
+    formats = list(FORMATS) if args.format == "both" else [args.format]
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    manifest = {} if args.force else load_manifest(MANIFEST_PATH)
+
+    print(f"📤 Exporting EEG recordings to {'+'.join(formats).upper()} "
+          f"(filtered {EXPORT_PARAMS['l_freq']:g}–{EXPORT_PARAMS['h_freq']:g} Hz; "
+          f"CSV: first {EXPORT_PARAMS['csv_tmax']:g} seconds, NPY: full length)...")
+    print("------------------------------------------------------------")
+
+    jobs, missing = find_recordings(RAW_DIR)
+    for set_fname in missing:
+        print(f"❌ Skipped (not found): {set_fname}")
+
+    pending = []
+    n_current = 0
+    for job in jobs:
+        job.update(source_fingerprint(job["set_path"]), formats=formats)
+        if is_current(manifest.get(job["stem"]), job, formats):
+            n_current += 1
+        else:
+            pending.append(job)
+
+    if n_current:
+        print(f"⏭️  Up to date (from manifest): {n_current}")
+    print(f"🔧 To export: {len(pending)} using {max(1, args.workers)} worker(s)")
+
+    n_exported = 0
+    n_failed = 0
+    bytes_read = 0
+    t0 = time.perf_counter()
+
+    def _record(result: dict):
+        nonlocal n_exported, n_failed, bytes_read
+        if result["ok"]:
+            manifest[result["stem"]] = {
+                "source": result["set_path"],
+                "formats": result["formats"],
+                "source_size": result["source_size"],
+                "source_mtime": result["source_mtime"],
+                "params": EXPORT_PARAMS,
+                "exported_at": time.time(),
+            }
+            # Persist after every recording so a crash loses at most the in-flight work
+            save_manifest(manifest, MANIFEST_PATH)
+            bytes_read += result["source_size"]
+            n_exported += 1
+            print(f"✅ Exported: {result['stem']} ({'+'.join(result['formats'])})")
+        else:
+            n_failed += 1
+            print(f"❌ Failed: {os.path.basename(result['set_path'])} ({result['error']})")
+
+    if args.workers <= 1:
+        for job in pending:
+            _record(export_recording(job))
+    elif pending:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(export_recording, job) for job in pending]
+            for fut in as_completed(futures):
+                _record(fut.result())
+
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    print("------------------------------------------------------------")
+    print(f"✅ Done. Exported: {n_exported} recordings. Up to date: {n_current}. "
+          f"Skipped: {len(missing) + n_failed}.")
+    if n_exported:
+        print(f"⏱️  {elapsed:.1f} s • {n_exported / elapsed:.2f} recordings/sec • "
+              f"{bytes_read / 1e6 / elapsed:.1f} MB/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,45 @@
+"""
+extract_clean_sleep_demo.py
+
+Extract the sleep (SLP*) and demographic variables, plus the survey design
+variables (weight, pseudo-stratum, pseudo-PSU) used for population estimates,
+from NHIS adult files (adultYY.csv, one per survey year) into a year-partitioned
+Parquet dataset, data/clean/nhis_sleep_demo/year=YYYY/part-0.parquet (see
+app/nhis_store.py). The newest year in the dataset is also written, with a
+`year` column, to data/clean/nhis_sleep_demo_clean.csv; re-extracting only
+older years leaves that CSV alone.
+
+Only the needed columns are parsed and each file is streamed in chunks, so
+memory stays bounded by the chunk size rather than the size of the survey
+files. Refused / not ascertained / don't know answers are set to missing per
+variable with one vectorized mask; every respondent is kept, with their design
+variables, so estimates over a filtered subgroup still see the full sample
+design. Re-running replaces the partitions of the given years and leaves other
+years untouched.
+
+Usage:
+    python scripts/extract_clean_sleep_demo.py                      # every data/raw/adultYY.csv
+    python scripts/extract_clean_sleep_demo.py --raw data/raw/adult22.csv data/raw/adult23.csv
+"""
+
 import os
+import sys
+import glob
+import argparse
+from typing import List, Optional
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from nhis_store import DATASET_PATH, YEAR_COL, available_years, partition_file, year_from_filename  # noqa: E402
 
 # -----------------------------
 # Paths
 # -----------------------------
 RAW_PATH = os.path.join("data", "raw", "adult24.csv")
+RAW_GLOB = os.path.join("data", "raw", "adult[0-9][0-9].csv")
 CLEAN_PATH = os.path.join("data", "clean", "nhis_sleep_demo_clean.csv")
 
 # -----------------------------
@@ -12,51 +47,104 @@ CLEAN_PATH = os.path.join("data", "clean", "nhis_sleep_demo_clean.csv")
 # -----------------------------
 SLEEP_PREFIX = "SLP"
 DEMO_VARS = ["SEX_A", "AGEP_A", "EDUCP_A"]
+# Survey design: final annual weight, pseudo-stratum, pseudo-PSU (see app/survey.py)
+DESIGN_VARS = ["WTFA_A", "PSTRAT", "PPSU"]
 
 # -----------------------------
-# Codes representing invalid responses
+# Codes for refused / not ascertained / don't know
 # -----------------------------
-INVALID_CODES = [7, 8, 9, 97, 98, 99]
+# Two-digit variables use 97-99, where 7-9 are real answers (hours of sleep,
+# education levels); one-digit items (sex, the frequency scales) use 7-9
+MISSING_CODES = {"SLPHOURS_A": [97, 98, 99], "AGEP_A": [97, 98, 99], "EDUCP_A": [97, 98, 99]}
+DEFAULT_MISSING_CODES = [7, 8, 9]
 
-# -----------------------------
-# Load dataset
-# -----------------------------
-df = pd.read_csv(RAW_PATH)
+CHUNKSIZE = 10_000
+# Every answered response is a small code, hour count or top-coded age
+DTYPE = "Int8"
+DESIGN_TYPES = {"WTFA_A": pa.float64(), "PSTRAT": pa.int16(), "PPSU": pa.int16()}
 
-# -----------------------------
-# Select sleep and demographic variables
-# -----------------------------
-sleep_vars = [col for col in df.columns if col.startswith(SLEEP_PREFIX)]
-selected_vars = sleep_vars + DEMO_VARS
-df_selected = df[selected_vars]
 
-# -----------------------------
-# Drop rows with invalid codes
-# -----------------------------
-for col in df_selected.columns:
-    df_selected = df_selected[~df_selected[col].isin(INVALID_CODES)]
+def selected_columns(raw_path: str) -> List[str]:
+    """SLP* columns in file order, then demographics and design variables (header read only)."""
+    header = pd.read_csv(raw_path, nrows=0).columns
+    return ([c for c in header if c.startswith(SLEEP_PREFIX)]
+            + [c for c in DEMO_VARS + DESIGN_VARS if c in header])
 
-# -----------------------------
-# Rename columns for clarity
-# -----------------------------
-rename_map = {
-    "SLPMEDINTRO_A": "sleep_med_intro",
-    "SLPHOURS_A": "sleep_hours_24h",
-    "SLPREST_A": "wake_well_rested_30d",
-    "SLPSTY_A": "trouble_staying_asleep_30d",
-    "SLPMED1_A": "medication_prescribed_30d",
-    "SLPMED2_A": "medication_otc_30d",
-    "SLPMED3_A": "medication_mj_cbd_30d",
-    "SEX_A": "sex",
-    "AGEP_A": "age",
-    "EDUCP_A": "education"
-}
-df_selected = df_selected.rename(columns=rename_map)
 
-# -----------------------------
-# Save cleaned dataset
-# -----------------------------
-os.makedirs(os.path.dirname(CLEAN_PATH), exist_ok=True)
-df_selected.to_csv(CLEAN_PATH, index=False)
+def column_schema(columns: List[str]) -> pa.Schema:
+    return pa.schema([(c, DESIGN_TYPES.get(c, pa.int8())) for c in columns])
+
+
+def clean_chunk(chunk: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """All rows, with each response column's missing codes set to NA (design variables untouched)."""
+    responses = [c for c in columns if c not in DESIGN_VARS]
+    codes = {c: MISSING_CODES.get(c, DEFAULT_MISSING_CODES) for c in responses}
+    answers = chunk[responses].mask(chunk[responses].isin(codes)).astype(DTYPE)
+    return pd.concat([answers, chunk[[c for c in columns if c in DESIGN_VARS]]], axis=1)[columns]
+
+
+def extract_year(raw_path: str, year: int, dataset_path: str, chunksize: int,
+                 csv_path: Optional[str] = None) -> int:
+    """Write one year's partition (and optionally the flat CSV, tagged with `year`); returns rows written."""
+    columns = selected_columns(raw_path)
+    schema = column_schema(columns)
+    out_path = partition_file(year, dataset_path)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_parquet = out_path + ".tmp"
+    tmp_csv = csv_path + ".tmp" if csv_path else None
+    if csv_path:
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+
+    n_rows = 0
+    with pq.ParquetWriter(tmp_parquet, schema) as writer, \
+            open(tmp_csv or os.devnull, "w", newline="") as f:
+        for i, chunk in enumerate(pd.read_csv(raw_path, usecols=columns, chunksize=chunksize)):
+            part = clean_chunk(chunk, columns)
+            writer.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+            if csv_path:
+                part.assign(**{YEAR_COL: year}).to_csv(f, index=False, header=(i == 0))
+            n_rows += len(part)
+        if csv_path and n_rows == 0:
+            pd.DataFrame(columns=columns + [YEAR_COL]).to_csv(f, index=False)
+    os.replace(tmp_parquet, out_path)
+    if csv_path:
+        os.replace(tmp_csv, csv_path)
+    return n_rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Extract NHIS sleep + demographic variables by survey year.")
+    ap.add_argument("--raw", nargs="+", default=None,
+                    help=f"NHIS adult CSVs named adultYY.csv (default: {RAW_GLOB})")
+    ap.add_argument("--dataset", default=DATASET_PATH, help="Year-partitioned Parquet output directory")
+    ap.add_argument("--csv", default=CLEAN_PATH, help="Flat CSV of the newest year ('' to skip)")
+    ap.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="Rows parsed per chunk")
+    args = ap.parse_args()
+
+    raw_files = args.raw or sorted(glob.glob(RAW_GLOB)) or [RAW_PATH]
+    by_year = {}
+    for path in raw_files:
+        year = year_from_filename(path)
+        if not os.path.exists(path):
+            print(f"❌ Not found: {path}")
+        elif year is None:
+            print(f"⚠️ Skipping {path}: expected a name like adult24.csv")
+        else:
+            by_year[year] = path
+    if not by_year:
+        return
+
+    # The CSV mirrors the newest partition overall, not just the newest file given
+    latest = max(available_years(args.dataset) + list(by_year))
+    for year in sorted(by_year):
+        n_rows = extract_year(by_year[year], year, args.dataset, args.chunksize,
+                              csv_path=args.csv if year == latest and args.csv else None)
+        print(f"✅ {year}: {n_rows} rows -> {partition_file(year, args.dataset)}")
+    if args.csv and latest in by_year:
+        print(f"📄 Latest year ({latest}) also saved to {args.csv}")
+    elif args.csv:
+        print(f"📄 {args.csv} left as is: it holds the newest year ({latest}), which was not re-extracted")
+
 
-print(f"✅ Cleaned file saved to {CLEAN_PATH} with {df_selected.shape[0]} rows.")
+if __name__ == "__main__":
+    main()